@@ -0,0 +1,123 @@
+"""
+Перенос закрытых и устаревших объявлений из ads в ads_archive.
+
+Раз в ARCHIVE_INTERVAL_SECONDS архиватор переносит пачками по
+ARCHIVE_BATCH_SIZE объявления, закрытые больше ARCHIVE_GRACE_HOURS назад, и
+активные старше AD_EXPIRE_DAYS (они получают state = 'expired'). Пачка —
+один запрос DELETE ... RETURNING внутри INSERT INTO ads_archive, поэтому
+строка не теряется и не дублируется; SKIP LOCKED позволяет запускать
+архиватор во всех воркерах. Так таблица ads, по которой ищет /ads, содержит
+только живые объявления.
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, insert, update, and_, or_, case, func
+
+from cache import listing_cache
+from config import (
+    ARCHIVE_ENABLED,
+    AD_EXPIRE_DAYS,
+    ARCHIVE_GRACE_HOURS,
+    ARCHIVE_INTERVAL_SECONDS,
+    ARCHIVE_BATCH_SIZE,
+)
+from database import new_session
+from models import Ad, ArchivedAd, User
+
+# колонки ads_archive, которые переносятся из ads как есть
+COPIED = [
+    column.name
+    for column in ArchivedAd.__table__.columns
+    if column.name in Ad.__table__.columns and column.name not in ("state", "closed_at")
+]
+
+
+def archive_query(now: datetime, batch: int):
+    expire_before = now - timedelta(days=AD_EXPIRE_DAYS)
+    closed_before = now - timedelta(hours=ARCHIVE_GRACE_HOURS)
+    victims = (
+        select(Ad.id)
+        .where(
+            or_(
+                and_(Ad.state != "active", Ad.closed_at < closed_before),
+                Ad.created_at < expire_before,
+            )
+        )
+        .limit(batch)
+        .with_for_update(skip_locked=True)
+    )
+    ads = Ad.__table__
+    moved = (
+        delete(ads)
+        .where(ads.c.id.in_(victims.scalar_subquery()))
+        .returning(*[ads.c[name] for name in COPIED], ads.c.state, ads.c.closed_at)
+        .cte("moved")
+    )
+    rows = select(
+        *[moved.c[name] for name in COPIED],
+        case((moved.c.state == "active", "expired"), else_=moved.c.state),
+        func.coalesce(moved.c.closed_at, func.now()),
+        func.now(),
+    )
+    # объявления пропали из /ads/my их владельцев
+    removed = (
+        update(User)
+        .where(User.id.in_(select(moved.c.user_id)))
+        .values(ads_removed_at=func.now())
+        .cte("removed")
+    )
+    return (
+        insert(ArchivedAd)
+        .from_select(COPIED + ["state", "closed_at", "archived_at"], rows)
+        .returning(ArchivedAd.id)
+        .add_cte(removed)
+    )
+
+
+class Archiver:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.stats = {"archived": 0, "runs": 0, "errors": 0}
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def archive(self) -> int:
+        """Переносит всё, что пора; возвращает число перенесённых объявлений."""
+        total = 0
+        while True:
+            async with new_session() as session:
+                result = await session.execute(
+                    archive_query(datetime.now(timezone.utc), ARCHIVE_BATCH_SIZE)
+                )
+                count = len(result.all())
+                await session.commit()
+            total += count
+            if count < ARCHIVE_BATCH_SIZE:
+                break
+        self.stats["runs"] += 1
+        self.stats["archived"] += total
+        if total:
+            # перенесённые пропадают из выдачи; проверять каждое против каждого ключа дороже
+            await listing_cache.invalidate(lambda params: True)
+        return total
+
+    async def _run(self):
+        while True:
+            try:
+                await self.archive()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print("Ошибка архивации объявлений:", e)
+            await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+
+archiver = Archiver(ARCHIVE_ENABLED)
@@ -1,55 +1,57 @@
 from jose import jwt
-from passlib.hash import bcrypt
+from uuid import uuid4
 from datetime import datetime, timedelta, timezone
-from config import (
-    SECRET_KEY,
-    ALGORITHM,
-    SMTP_HOST,
-    SMTP_PASSWORD,
-    SMTP_PORT,
-    SMTP_USER,
-    APP_URL,
-    EMAIL_FROM,
-)
-import smtplib
+from config import JWT, SMTP
+from hashing import hasher
+from mailer import mailer
 from email.mime.text import MIMEText
 
 
 def create_token(data: dict, expires_delta: timedelta):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + expires_delta
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # jti — чтобы отозвать конкретный токен (см. revocation.py)
+    to_encode.update({"exp": expire, "jti": uuid4().hex})
+    return jwt.encode(to_encode, JWT.secret_key, algorithm=JWT.algorithm)
 
 
-def verify_password(plain_password, hashed_password):
-    return bcrypt.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await hasher.verify(plain_password, hashed_password)
 
 
-def hash_password(password):
-    return bcrypt.hash(password)
+async def hash_password(password):
+    return await hasher.hash(password)
 
 
 async def send_verification_email(email: str, token: str):
-    link = f"{APP_URL}/verify?token={token}"
+    link = f"{SMTP.app_url}/verify?token={token}"
     msg = MIMEText(f"Подтвердите email, перейдя по ссылке: {link}")
     msg["Subject"] = "Подтверждение email для FindYourPet"
-    msg["From"] = EMAIL_FROM
+    msg["From"] = SMTP.email_from
     msg["To"] = email
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
-        server.sendmail(EMAIL_FROM, email, msg.as_string())
+    mailer.enqueue(email, msg)
+
 
 async def send_verification_email_change(new_email: str, token: str):
-    link = f"{APP_URL}/user/verify-email-change?token={token}"
+    link = f"{SMTP.app_url}/user/verify-email-change?token={token}"
     msg = MIMEText(f"Подтвердите смену email, перейдя по ссылке: {link}")
     msg['Subject'] = "Подтверждение смены email для FindYourPet"
-    msg['From'] = EMAIL_FROM
+    msg['From'] = SMTP.email_from
     msg['To'] = new_email
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-        server.starttls()
-        server.login(SMTP_USER, SMTP_PASSWORD)
-        server.sendmail(EMAIL_FROM, new_email, msg.as_string())
+    mailer.enqueue(new_email, msg)
+
+
+async def send_match_email(email: str, ad, matches):
+    """matches — [(id второго объявления пары, оценка)] для объявления ad владельца email."""
+    # GET /ads/{id}; все пары владельца — GET /ads/matches
+    lines = [f"{SMTP.app_url}/ads/{other_id} (совпадение {score:.0%})" for other_id, score in matches]
+    msg = MIMEText(
+        f"Для вашего объявления «{ad.nickname or ad.breed}» найдены похожие:\n" + "\n".join(lines)
+    )
+    msg["Subject"] = "Похожие объявления на FindYourPet"
+    msg["From"] = SMTP.email_from
+    msg["To"] = email
+
+    mailer.enqueue(email, msg)
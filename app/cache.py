@@ -0,0 +1,178 @@
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict
+from config import CACHE
+
+
+class MemoryBackend:
+    """LRU с TTL в памяти процесса."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self.evictions = 0
+        self.generations: dict[str, int] = {}
+
+    async def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, keys):
+        for key in keys:
+            self.entries.pop(key, None)
+
+    async def keys(self, prefix: str):
+        return [key for key in self.entries if key.startswith(prefix)]
+
+    async def generation(self, prefix: str) -> int:
+        return self.generations.get(prefix, 0)
+
+    async def bump_generation(self, prefix: str):
+        self.generations[prefix] = self.generations.get(prefix, 0) + 1
+
+
+class RedisBackend:
+    """Общий кэш для нескольких воркеров. Нужен пакет redis."""
+
+    def __init__(self, url: str):
+        from redis import asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.evictions = 0  # вытеснение считает сам Redis
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(key, value, ex=math.ceil(ttl))
+
+    async def delete(self, keys):
+        if keys:
+            await self.client.delete(*keys)
+
+    async def keys(self, prefix: str):
+        return [key.decode() async for key in self.client.scan_iter(match=prefix + "*")]
+
+    # поколение общее для всех воркеров; ключ вне prefix*, keys() его не видит
+    async def generation(self, prefix: str) -> int:
+        return int(await self.client.get("generation:" + prefix) or 0)
+
+    async def bump_generation(self, prefix: str):
+        await self.client.incr("generation:" + prefix)
+
+
+class QueryCache:
+    """
+    Кэш готовых JSON-ответов. Ключ — префикс + нормализованные параметры
+    запроса, поэтому при инвалидации параметры восстанавливаются из ключа.
+    Одновременные промахи по одному ключу ждут один общий запрос к БД.
+
+    invalidate() повышает поколение кэша: загрузка, начатая до инвалидации,
+    отдаёт результат своим запросам, но не сохраняет его. Инвалидация
+    проверяет каждый ключ кэша — O(размер кэша) на запись; при
+    CACHE_MAX_ENTRIES порядка тысяч это дешевле запроса к БД.
+    """
+
+    def __init__(self, backend, ttl: float, prefix: str):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0, "stale": 0}
+        # ключ -> (поколение, future загрузки)
+        self._inflight: dict[str, tuple[int, asyncio.Future]] = {}
+
+    @property
+    def evictions(self):
+        return self.backend.evictions
+
+    def key(self, params: dict) -> str:
+        return self.prefix + json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+    async def get(self, key: str):
+        value = await self.backend.get(key)
+        if value is not None:
+            self.stats["hits"] += 1
+        return value
+
+    async def get_or_load(self, key: str, loader):
+        value = await self.get(key)
+        if value is not None:
+            return value
+        return await self.load(key, loader)
+
+    async def load(self, key: str, loader):
+        """Промах: загрузка loader(), общая для одновременных запросов по key."""
+        generation = await self.backend.generation(self.prefix)
+        while True:
+            inflight = self._inflight.get(key)
+            # к загрузке, начатой до инвалидации, не присоединяемся
+            if inflight is None or inflight[0] != generation:
+                break
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight[1])
+            except asyncio.CancelledError:
+                # отменили загружавший запрос, а не нас: загружаем сами
+                if not inflight[1].cancelled():
+                    raise
+                generation = await self.backend.generation(self.prefix)
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (generation, future)
+        try:
+            value = await loader()
+            if await self.backend.generation(self.prefix) == generation:
+                await self.backend.set(key, value, self.ttl)
+            else:
+                self.stats["stale"] += 1
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # ожидающих может не быть
+            raise
+        finally:
+            if self._inflight.get(key, (None, None))[1] is future:
+                del self._inflight[key]
+
+    async def invalidate(self, predicate):
+        """Удаляет записи, для параметров которых predicate(params) истинно."""
+        # до удаления: загрузки, которые идут сейчас, уже не сохранятся
+        await self.backend.bump_generation(self.prefix)
+        stale = []
+        for key in await self.backend.keys(self.prefix):
+            if predicate(json.loads(key[len(self.prefix):])):
+                stale.append(key)
+        await self.backend.delete(stale)
+        self.stats["invalidations"] += len(stale)
+
+
+def make_backend(max_entries: int = CACHE.max_entries):
+    if CACHE.url:
+        return RedisBackend(CACHE.url)
+    return MemoryBackend(max_entries)
+
+
+listing_cache = QueryCache(make_backend(), CACHE.ttl_seconds, prefix="ads:")
+# счётчики фасетов не сбрасываются при создании объявлений: живут FACETS_TTL_SECONDS
+facet_cache = QueryCache(make_backend(), CACHE.facets_ttl_seconds, prefix="facets:")
@@ -0,0 +1,20 @@
+"""
+Сжатие ответов (COMPRESSION) с исключением путей.
+
+JPEG из /photos/ уже сжат, и сжатие ломает Range-запросы; SSE из
+/ads/feed нельзя буферизовать. Эти пути обходят middleware сжатия целиком,
+а не через Content-Encoding: identity в ответе.
+"""
+
+
+class CompressionExcept:
+    def __init__(self, app, middleware, excluded: tuple[str, ...], **options):
+        self.plain = app
+        self.compressed = middleware(app, **options)
+        self.excluded = excluded
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.excluded):
+            await self.plain(scope, receive, send)
+        else:
+            await self.compressed(scope, receive, send)
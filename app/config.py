@@ -1,22 +1,290 @@
+from dataclasses import dataclass
 from os import environ
+from typing import Optional
 from dotenv import load_dotenv
 
+# единственное чтение .env: остальные модули берут настройки отсюда
 load_dotenv()
 
-SECRET_KEY = environ.get("SECRET_KEY", "notfound")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 5
-REFRESH_TOKEN_EXPIRE_DAYS = 7
+# dev — миграции при старте; production — только проверка, что они применены
+# (python migrations.py перед запуском воркеров), и прогрев перед готовностью
+STARTUP_MODE = environ.get("STARTUP_MODE", "dev")
+if STARTUP_MODE not in ("dev", "production"):
+    raise ValueError(f"Неизвестный STARTUP_MODE: {STARTUP_MODE}")
 
-if not SECRET_KEY or SECRET_KEY == "notfound":
-    raise ValueError("SECRET_KEY не задан в .env")
 
-SMTP_HOST = environ.get("SMTP_HOST")
-SMTP_PORT = int(environ.get("SMTP_PORT", 587))
-SMTP_USER = environ.get("SMTP_USER")
-SMTP_PASSWORD = environ.get("SMTP_PASSWORD")
-APP_URL = environ.get("APP_URL")
-EMAIL_FROM = environ.get("EMAIL_FROM")
+def optional(name: str, parse):
+    value = environ.get(name)
+    return None if value is None else parse(value)
 
-if not all([SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, APP_URL, EMAIL_FROM]):
-    raise ValueError("SMTP переменные не заданы в .env")
\ No newline at end of file
+
+def flag(name: str, default: str = "0") -> bool:
+    return environ.get(name, default) == "1"
+
+
+@dataclass(frozen=True)
+class JwtSettings:
+    secret_key: str
+    algorithm: str
+    access_token_expire_minutes: int
+    refresh_token_expire_days: int
+
+
+def load_jwt_settings():
+    settings = JwtSettings(
+        secret_key=environ.get("SECRET_KEY", "notfound"),
+        algorithm="HS256",
+        access_token_expire_minutes=5,
+        refresh_token_expire_days=7,
+    )
+    if not settings.secret_key or settings.secret_key == "notfound":
+        raise ValueError("SECRET_KEY не задан в .env")
+    return settings
+
+
+JWT = load_jwt_settings()
+
+
+@dataclass(frozen=True)
+class SmtpSettings:
+    host: str
+    port: int
+    # можно не задавать для локального SMTP без авторизации
+    user: Optional[str]
+    password: Optional[str]
+    starttls: bool
+    idle_seconds: float  # простой, после которого соединение закрывается
+    app_url: str  # для ссылок в письмах
+    email_from: str
+
+
+def load_smtp_settings():
+    settings = SmtpSettings(
+        host=environ.get("SMTP_HOST"),
+        port=int(environ.get("SMTP_PORT", 587)),
+        user=environ.get("SMTP_USER"),
+        password=environ.get("SMTP_PASSWORD"),
+        starttls=flag("SMTP_STARTTLS", "1"),
+        idle_seconds=float(environ.get("SMTP_IDLE_SECONDS", 60)),
+        app_url=environ.get("APP_URL"),
+        email_from=environ.get("EMAIL_FROM"),
+    )
+    if not all([settings.host, settings.port, settings.app_url, settings.email_from]):
+        raise ValueError("SMTP переменные не заданы в .env")
+    return settings
+
+
+SMTP = load_smtp_settings()
+
+
+@dataclass(frozen=True)
+class DatabaseSettings:
+    user: str
+    password: str
+    name: str
+    host: str
+    port: int
+    # default — один процесс; multiworker — бюджет max_connections делится
+    # между web_concurrency воркерами uvicorn; pgbouncer — за PgBouncer в режиме
+    # transaction (без prepared statements); null — без пула
+    pool_profile: str
+    max_connections: int
+    web_concurrency: int
+    pool_warmup: int  # соединений, открываемых при старте
+    pool_timeout: float
+    pool_recycle: int
+    # заданные явно перекрывают профиль
+    pool_size: Optional[int]
+    max_overflow: Optional[int]
+    pool_pre_ping: Optional[bool]
+    pgbouncer: bool
+    statement_cache_size: int
+
+    @property
+    def url(self):
+        credentials = f"{self.user}:{self.password}"
+        return f"postgresql+asyncpg://{credentials}@{self.host}:{self.port}/{self.name}"
+
+
+def load_database_settings():
+    settings = DatabaseSettings(
+        user=environ.get("DB_USER"),
+        password=environ.get("DB_PASSWORD"),
+        name=environ.get("DB_NAME"),
+        host=environ.get("DB_HOST", "localhost"),
+        port=int(environ.get("DB_PORT", 5432)),
+        pool_profile=environ.get("DB_POOL_PROFILE", "default"),
+        max_connections=int(environ.get("DB_MAX_CONNECTIONS", 90)),
+        web_concurrency=int(environ.get("WEB_CONCURRENCY", 1)),
+        pool_warmup=int(environ.get("DB_POOL_WARMUP", 2 if STARTUP_MODE == "production" else 0)),
+        pool_timeout=float(environ.get("DB_POOL_TIMEOUT", 30)),
+        pool_recycle=int(environ.get("DB_POOL_RECYCLE", 1800)),
+        pool_size=optional("DB_POOL_SIZE", int),
+        max_overflow=optional("DB_MAX_OVERFLOW", int),
+        pool_pre_ping=optional("DB_POOL_PRE_PING", lambda value: value == "1"),
+        pgbouncer=environ.get("DB_PGBOUNCER") == "1",
+        statement_cache_size=int(environ.get("DB_STATEMENT_CACHE_SIZE", 100)),
+    )
+    if not all([settings.user, settings.password, settings.name]):
+        raise ValueError("Отсутсвуют необходимые переменные для БД")
+    if settings.pool_profile not in ("default", "multiworker", "pgbouncer", "null"):
+        raise ValueError(f"Неизвестный DB_POOL_PROFILE: {settings.pool_profile}")
+    return settings
+
+
+DB = load_database_settings()
+
+
+@dataclass(frozen=True)
+class CacheSettings:
+    url: Optional[str]  # redis://... — общий кэш воркеров (пакет redis, requirements-optional.txt)
+    ttl_seconds: int  # список объявлений
+    max_entries: int
+    user_ttl_seconds: int
+    user_max_entries: int
+    facets_ttl_seconds: int
+
+
+def load_cache_settings():
+    settings = CacheSettings(
+        url=environ.get("CACHE_URL") or None,
+        ttl_seconds=int(environ.get("CACHE_TTL_SECONDS", 30)),
+        max_entries=int(environ.get("CACHE_MAX_ENTRIES", 1024)),
+        user_ttl_seconds=int(environ.get("USER_CACHE_TTL_SECONDS", 60)),
+        user_max_entries=int(environ.get("USER_CACHE_MAX_ENTRIES", 10000)),
+        facets_ttl_seconds=int(environ.get("FACETS_TTL_SECONDS", 60)),
+    )
+    if settings.url and not settings.url.startswith(("redis://", "rediss://", "unix://")):
+        raise ValueError(f"CACHE_URL должен быть адресом Redis: {settings.url}")
+    if settings.max_entries < 1 or settings.user_max_entries < 1:
+        raise ValueError("CACHE_MAX_ENTRIES и USER_CACHE_MAX_ENTRIES должны быть больше 0")
+    return settings
+
+
+CACHE = load_cache_settings()
+
+
+@dataclass(frozen=True)
+class RateLimitSettings:
+    enabled: bool
+    url: Optional[str]  # redis://... — общие лимиты воркеров (пакет redis); по умолчанию CACHE_URL
+    trust_proxy: bool  # брать IP из X-Forwarded-For
+    max_keys: int
+    # ёмкость корзины и пополнение в минуту, в единицах стоимости
+    ip_burst: int
+    ip_per_minute: float
+    account_burst: int
+    account_per_minute: float
+    # сброс нагрузки: задержка цикла событий и заполненность очередей
+    shed_loop_lag_seconds: float
+    shed_hasher_ratio: float
+    shed_email_ratio: float
+
+
+def load_rate_limit_settings():
+    settings = RateLimitSettings(
+        enabled=flag("RATE_LIMIT_ENABLED", "1"),
+        url=environ.get("RATE_LIMIT_URL", CACHE.url) or None,
+        trust_proxy=flag("RATE_LIMIT_TRUST_PROXY"),
+        max_keys=int(environ.get("RATE_LIMIT_MAX_KEYS", 100000)),
+        ip_burst=int(environ.get("RATE_LIMIT_IP_BURST", 60)),
+        ip_per_minute=float(environ.get("RATE_LIMIT_IP_PER_MINUTE", 30)),
+        account_burst=int(environ.get("RATE_LIMIT_ACCOUNT_BURST", 30)),
+        account_per_minute=float(environ.get("RATE_LIMIT_ACCOUNT_PER_MINUTE", 10)),
+        shed_loop_lag_seconds=float(environ.get("SHED_LOOP_LAG_SECONDS", 0.25)),
+        shed_hasher_ratio=float(environ.get("SHED_HASHER_RATIO", 0.75)),
+        shed_email_ratio=float(environ.get("SHED_EMAIL_RATIO", 0.8)),
+    )
+    if min(settings.ip_burst, settings.account_burst) < 1:
+        raise ValueError("RATE_LIMIT_*_BURST должны быть больше 0")
+    if min(settings.ip_per_minute, settings.account_per_minute) <= 0:
+        raise ValueError("RATE_LIMIT_*_PER_MINUTE должны быть больше 0")
+    return settings
+
+
+RATE_LIMIT = load_rate_limit_settings()
+
+
+@dataclass(frozen=True)
+class StorageSettings:
+    backend: str  # local; проверяется в storage.make_storage()
+    dir: str
+    url_prefix: str  # можно указать CDN
+
+
+def load_storage_settings():
+    settings = StorageSettings(
+        backend=environ.get("PHOTO_STORAGE", "local"),
+        dir=environ.get("PHOTO_DIR", "media/photos"),
+        url_prefix=environ.get("PHOTO_URL_PREFIX", "/photos/"),
+    )
+    if not settings.url_prefix.endswith("/"):
+        raise ValueError(f"PHOTO_URL_PREFIX должен заканчиваться на /: {settings.url_prefix}")
+    return settings
+
+
+STORAGE = load_storage_settings()
+
+EMAIL_QUEUE_SIZE = int(environ.get("EMAIL_QUEUE_SIZE", 1000))
+EMAIL_BATCH_SIZE = int(environ.get("EMAIL_BATCH_SIZE", 20))
+EMAIL_MAX_ATTEMPTS = int(environ.get("EMAIL_MAX_ATTEMPTS", 5))
+EMAIL_RETRY_BASE_SECONDS = float(environ.get("EMAIL_RETRY_BASE_SECONDS", 2))
+
+PASSWORD_POOL = environ.get("PASSWORD_POOL", "thread")  # thread | process
+PASSWORD_POOL_SIZE = int(environ.get("PASSWORD_POOL_SIZE", 4))
+PASSWORD_QUEUE_LIMIT = int(environ.get("PASSWORD_QUEUE_LIMIT", 64))
+BCRYPT_ROUNDS = int(environ.get("BCRYPT_ROUNDS", 12))
+PASSWORD_REHASH_ON_LOGIN = environ.get("PASSWORD_REHASH_ON_LOGIN", "1") == "1"
+
+METRICS_ENABLED = environ.get("METRICS_ENABLED", "1") == "1"
+SLOW_QUERY_MS = float(environ.get("SLOW_QUERY_MS", 200))
+LOOP_LAG_INTERVAL = float(environ.get("LOOP_LAG_INTERVAL", 0.5))
+
+BULK_MAX_ITEMS = int(environ.get("BULK_MAX_ITEMS", 1000))  # POST /ads/bulk
+BULK_BATCH_SIZE = int(environ.get("BULK_BATCH_SIZE", 500))
+IMPORT_MAX_ERRORS = int(environ.get("IMPORT_MAX_ERRORS", 100))
+
+# Cache-Control: max-age публичного списка объявлений для браузеров и CDN
+LISTING_MAX_AGE = int(environ.get("LISTING_MAX_AGE", 10))
+
+COMPRESSION = environ.get("COMPRESSION", "gzip")  # gzip | brotli | off; brotli — пакет brotli-asgi
+COMPRESSION_MIN_SIZE = int(environ.get("COMPRESSION_MIN_SIZE", 1000))  # байт
+GZIP_LEVEL = int(environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(environ.get("BROTLI_QUALITY", 4))
+# не сжимаются: готовые JPEG с Range-запросами и SSE
+COMPRESSION_EXCLUDED_PATHS = ("/photos/", "/ads/feed")
+
+FEED_NOTIFY = environ.get("FEED_NOTIFY", "0") == "1"  # рассылка между воркерами через LISTEN/NOTIFY
+FEED_CELL_DEG = float(environ.get("FEED_CELL_DEG", 0.25))
+FEED_MAX_CELLS = int(environ.get("FEED_MAX_CELLS", 2000))
+FEED_QUEUE_SIZE = int(environ.get("FEED_QUEUE_SIZE", 100))
+FEED_MAX_SUBSCRIBERS = int(environ.get("FEED_MAX_SUBSCRIBERS", 10000))
+FEED_HEARTBEAT_SECONDS = float(environ.get("FEED_HEARTBEAT_SECONDS", 15))
+
+MATCH_ENABLED = environ.get("MATCH_ENABLED", "1") == "1"
+MATCH_RADIUS_KM = float(environ.get("MATCH_RADIUS_KM", 20))
+MATCH_WINDOW_DAYS = float(environ.get("MATCH_WINDOW_DAYS", 30))
+MATCH_MIN_SCORE = float(environ.get("MATCH_MIN_SCORE", 0.5))
+MATCH_CANDIDATES = int(environ.get("MATCH_CANDIDATES", 50))
+MATCH_QUEUE_SIZE = int(environ.get("MATCH_QUEUE_SIZE", 10000))
+MATCH_EMAIL = environ.get("MATCH_EMAIL", "0") == "1"
+
+REVOCATION_MAX_ENTRIES = int(environ.get("REVOCATION_MAX_ENTRIES", 100000))
+REVOCATION_SYNC_SECONDS = float(environ.get("REVOCATION_SYNC_SECONDS", 5))
+# строки за это окно перечитываются при каждой синхронизации; больше самой долгой транзакции
+REVOCATION_SYNC_OVERLAP_SECONDS = float(environ.get("REVOCATION_SYNC_OVERLAP_SECONDS", 60))
+
+PHOTO_MAX_BYTES = int(environ.get("PHOTO_MAX_BYTES", 10 * 1024 * 1024))
+PHOTO_MAX_PER_AD = int(environ.get("PHOTO_MAX_PER_AD", 10))
+PHOTO_POOL_SIZE = int(environ.get("PHOTO_POOL_SIZE", 2))
+THUMBNAIL_SIZE = int(environ.get("THUMBNAIL_SIZE", 320))  # px по длинной стороне
+PREVIEW_SIZE = int(environ.get("PREVIEW_SIZE", 1280))
+PHOTO_QUEUE_SIZE = int(environ.get("PHOTO_QUEUE_SIZE", 1000))
+
+ARCHIVE_ENABLED = environ.get("ARCHIVE_ENABLED", "1") == "1"
+AD_EXPIRE_DAYS = int(environ.get("AD_EXPIRE_DAYS", 90))  # активное объявление старше — в архив
+ARCHIVE_GRACE_HOURS = int(environ.get("ARCHIVE_GRACE_HOURS", 24))  # закрытое можно открыть снова
+ARCHIVE_INTERVAL_SECONDS = int(environ.get("ARCHIVE_INTERVAL_SECONDS", 600))
+ARCHIVE_BATCH_SIZE = int(environ.get("ARCHIVE_BATCH_SIZE", 1000))
+
+READY_DB_TIMEOUT = float(environ.get("READY_DB_TIMEOUT", 1))  # проверка БД в /health/ready
@@ -1,27 +1,93 @@
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy.pool import NullPool
-from os import environ
-from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
+from uuid import uuid4
+import asyncio
+import time
 
-load_dotenv()
+from config import DB
 
-DB_USER = environ.get("DB_USER")
-DB_PASSWORD = environ.get("DB_PASSWORD")
-DB_HOST = environ.get("DB_HOST", "localhost")
-DB_PORT = environ.get("DB_PORT", "5432")
-DB_NAME = environ.get("DB_NAME")
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = DB.url
 
-if not all([DB_USER, DB_PASSWORD, DB_NAME]):
-    raise ValueError("Отсутсвуют необходимые переменные для БД")
 
-engine = create_async_engine(DATABASE_URL)
-new_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)    
+def pool_settings():
+    if DB.pool_profile == "multiworker":
+        per_worker = max(2, DB.max_connections // max(1, DB.web_concurrency))
+        pool_size = per_worker * 2 // 3
+        settings = {"pool_size": pool_size, "max_overflow": per_worker - pool_size}
+    elif DB.pool_profile == "pgbouncer":
+        # соединения к PgBouncer дешёвые, очередь держит он
+        settings = {"pool_size": 20, "max_overflow": 0, "pool_pre_ping": True}
+    else:
+        settings = {"pool_size": 5, "max_overflow": 10}
+
+    settings["pool_timeout"] = DB.pool_timeout
+    settings["pool_recycle"] = DB.pool_recycle
+    for key in ("pool_size", "max_overflow", "pool_pre_ping"):
+        if getattr(DB, key) is not None:
+            settings[key] = getattr(DB, key)
+    return settings
+
+
+def connect_args():
+    if DB.pool_profile == "pgbouncer" or DB.pgbouncer:
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {"prepared_statement_cache_size": DB.statement_cache_size}
+
+
+pool_stats = {"checkouts": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, который считает время ожидания свободного соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            pool_stats["checkouts"] += 1
+            pool_stats["wait_seconds"] += waited
+            pool_stats["max_wait_seconds"] = max(pool_stats["max_wait_seconds"], waited)
+
+
+if DB.pool_profile == "null":
+    engine = create_async_engine(DATABASE_URL, poolclass=NullPool, connect_args=connect_args())
+else:
+    engine = create_async_engine(
+        DATABASE_URL, poolclass=TimedQueuePool, connect_args=connect_args(), **pool_settings()
+    )
+new_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+
+def pool_status():
+    pool = engine.pool
+    status = {"profile": DB.pool_profile, **pool_stats}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(size=pool.size(), in_use=pool.checkedout(), overflow=pool.overflow())
+    return status
+
+
+async def warm_up(count: int = DB.pool_warmup):
+    """Открывает count соединений заранее, чтобы первые запросы не ждали connect."""
+    if count <= 0 or DB.pool_profile == "null":
+        return
+    connections = await asyncio.gather(*(engine.connect() for _ in range(count)))
+    try:
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in connections))
+    finally:
+        await asyncio.gather(*(conn.close() for conn in connections))
+
 
 class Base(DeclarativeBase):
     pass
 
 async def get_session():
     async with new_session() as session:
-        yield session
\ No newline at end of file
+        yield session
@@ -1,30 +1,103 @@
+import json
 from typing import Annotated
 from fastapi import Depends, HTTPException, Request
 from jose import jwt, JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_session
 from models import User
-from config import SECRET_KEY, ALGORITHM
+from cache import make_backend
+from revocation import revocations
+from config import JWT, CACHE
 
 sessionDep = Annotated[AsyncSession, Depends(get_session)]
 
+# профили пользователей для чтения; сбрасываются при изменении и удалении.
+# С CACHE_URL кэш общий и сброс виден всем воркерам; без него кэш у каждого
+# воркера свой, и остальные отдают старый профиль до USER_CACHE_TTL_SECONDS
+user_cache = make_backend(CACHE.user_max_entries)
 
-async def get_current_user(request: Request, session: sessionDep):
+
+class Principal:
+    """Пользователь из claims access токена, без обращения к БД."""
+
+    __slots__ = ("id", "role", "token_version")
+
+    def __init__(self, id: int, role: str, token_version: int):
+        self.id = id
+        self.role = role
+        self.token_version = token_version
+
+    @classmethod
+    def from_claims(cls, payload: dict):
+        return cls(int(payload["sub"]), payload.get("role", "user"), payload.get("ver", 0))
+
+
+def user_claims(user: User):
+    return {"sub": str(user.id), "role": user.role, "ver": user.token_version}
+
+
+def decode_access_token(request: Request):
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(status_code=401, detail="Нет access токена")
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = int(payload["sub"])
+        return jwt.decode(token, JWT.secret_key, algorithms=[JWT.algorithm])
     except JWTError:
         raise HTTPException(status_code=401, detail="Токен недействителен")
 
-    user = await session.get(User, user_id)
+
+async def get_principal(request: Request):
+    payload = decode_access_token(request)
+    try:
+        principal = Principal.from_claims(payload)
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=401, detail="Токен недействителен")
+    # словари в памяти; в БД — только если список переполнен
+    if await revocations.revoked(payload):
+        raise HTTPException(status_code=401, detail="Токен отозван")
+    return principal
+
+
+principalDep = Annotated[Principal, Depends(get_principal)]
+
+
+async def get_current_user(principal: principalDep, session: sessionDep):
+    user = await session.get(User, principal.id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
+    # пользователь уже загружен: версию можно сверить точно, без ожидания синхронизации
+    if principal.token_version < user.token_version:
+        raise HTTPException(status_code=401, detail="Токен отозван")
 
     return user
 
 
 userDep = Annotated[User, Depends(get_current_user)]
+
+
+async def get_user_profile(user_id: int, session: AsyncSession):
+    cached = await user_cache.get(user_key(user_id))
+    if cached is not None:
+        return json.loads(cached)
+
+    user = await session.get(User, user_id)
+    if not user:
+        return None
+
+    profile = {
+        "name": user.name,
+        "date": user.created_at.strftime("%d.%m.%Y"),
+        "email": user.email,
+        "phone": user.phone,
+    }
+    await user_cache.set(user_key(user_id), json.dumps(profile).encode(), CACHE.user_ttl_seconds)
+    return profile
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+async def forget_user(user_id: int):
+    await user_cache.delete([user_key(user_id)])
@@ -0,0 +1,192 @@
+"""
+Рассылка новых объявлений подписчикам GET /ads/feed (SSE).
+
+Подписки с геолокацией хранятся в ячейках сетки FEED_CELL_DEG градусов,
+которые покрывает их радиус; остальные — по паре (status, type). Новое
+объявление проверяется только против подписок своей ячейки и своей пары,
+а не против всех подключённых клиентов.
+
+Без FEED_NOTIFY объявление рассылается в том процессе, где создано. С
+FEED_NOTIFY=1 create_ad отправляет id через pg_notify в своей транзакции,
+а каждый воркер слушает канал отдельным соединением и рассылает своим
+подписчикам — так ленту получают клиенты всех воркеров.
+"""
+import asyncio
+from math import floor
+
+import asyncpg
+from sqlalchemy import select, func
+
+from config import (
+    FEED_CELL_DEG,
+    FEED_MAX_CELLS,
+    FEED_QUEUE_SIZE,
+    FEED_MAX_SUBSCRIBERS,
+    FEED_NOTIFY,
+)
+from database import DATABASE_URL, new_session
+from geo import bounding_box
+from models import Ad
+from schemas import AdOut, AdCard
+
+CHANNEL = "ads_feed"
+NOTIFY_BATCH = 500
+ROWS = round(180 / FEED_CELL_DEG)
+COLUMNS = round(360 / FEED_CELL_DEG)
+SCHEMAS = {"full": AdOut, "card": AdCard}
+
+
+def cell(lat, lon):
+    row = min(ROWS - 1, floor((lat + 90) / FEED_CELL_DEG))
+    return row, floor((lon + 180) / FEED_CELL_DEG) % COLUMNS
+
+
+def covered_cells(lat, lon, radius_km):
+    """Ячейки прямоугольника вокруг круга или None, если их больше FEED_MAX_CELLS."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    rows = range(cell(min_lat, 0)[0], cell(max_lat, 0)[0] + 1)
+    first = floor((min_lon + 180) / FEED_CELL_DEG)
+    last = floor((max_lon + 180) / FEED_CELL_DEG)
+    columns = range(COLUMNS) if last - first + 1 >= COLUMNS else range(first, last + 1)
+    if len(rows) * len(columns) > FEED_MAX_CELLS:
+        return None
+    return [(row, column % COLUMNS) for row in rows for column in columns]
+
+
+class Subscription:
+    __slots__ = ("params", "fields", "queue", "keys")
+
+    def __init__(self, params: dict, fields: str):
+        self.params = params
+        self.fields = fields
+        self.queue = asyncio.Queue(maxsize=FEED_QUEUE_SIZE)
+        self.keys = []
+
+
+class Broadcaster:
+    def __init__(self, matches):
+        # matches(params, ad) — то же условие, что у списка объявлений
+        self.matches = matches
+        self.index: dict[tuple, set[Subscription]] = {}
+        self.count = 0
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+        self._listener = None
+        self._connection = None
+        self._loads = set()
+
+    def subscribe(self, params: dict, fields: str):
+        if self.count >= FEED_MAX_SUBSCRIBERS:
+            return None
+        subscription = Subscription(params, fields)
+        cells = None
+        if "geoloc" in params:
+            cells = covered_cells(*params["geoloc"], params["radius"])
+        if cells is not None:
+            subscription.keys = [("cell",) + key for key in cells]
+        else:
+            subscription.keys = [("kind", params.get("status", "*"), params.get("type", "*"))]
+        for key in subscription.keys:
+            self.index.setdefault(key, set()).add(subscription)
+        self.count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for key in subscription.keys:
+            bucket = self.index.get(key)
+            if bucket is not None:
+                bucket.discard(subscription)
+                if not bucket:
+                    del self.index[key]
+        self.count -= 1
+
+    def candidates(self, ad):
+        keys = [
+            ("kind", status, kind)
+            for status in (ad.status, "*")
+            for kind in (ad.type, "*")
+        ]
+        if ad.lat is not None:
+            keys.append(("cell",) + cell(ad.lat, ad.lon))
+        found = set()
+        for key in keys:
+            found |= self.index.get(key, set())
+        return found
+
+    def dispatch(self, ads):
+        """Раскладывает объявления по очередям подходящих подписчиков."""
+        for ad in ads:
+            self.stats["published"] += 1
+            payloads = {}
+            for subscription in self.candidates(ad):
+                if not self.matches(subscription.params, ad):
+                    continue
+                payload = payloads.get(subscription.fields)
+                if payload is None:
+                    schema = SCHEMAS[subscription.fields]
+                    payload = payloads[subscription.fields] = (
+                        schema.model_validate(ad).model_dump_json()
+                    )
+                queue = subscription.queue
+                if queue.full():
+                    # медленный клиент теряет самое старое событие, а не тормозит остальных
+                    queue.get_nowait()
+                    self.stats["dropped"] += 1
+                queue.put_nowait((ad.id, payload))
+                self.stats["delivered"] += 1
+
+    async def notify(self, session, ads):
+        """До commit: с FEED_NOTIFY id уходят в pg_notify вместе с транзакцией."""
+        if not FEED_NOTIFY:
+            return
+        ids = [str(ad.id) for ad in ads]
+        # payload NOTIFY ограничен 8000 байт
+        for start in range(0, len(ids), NOTIFY_BATCH):
+            payload = ",".join(ids[start : start + NOTIFY_BATCH])
+            await session.execute(select(func.pg_notify(CHANNEL, payload)))
+
+    def publish(self, ads):
+        """После commit: без FEED_NOTIFY рассылает подписчикам этого процесса."""
+        if not FEED_NOTIFY:
+            self.dispatch(ads)
+
+    async def _on_notify(self, payload: str):
+        ids = [int(value) for value in payload.split(",") if value]
+        try:
+            async with new_session() as session:
+                query = select(Ad).where(Ad.id.in_(ids)).order_by(Ad.id)
+                ads = (await session.scalars(query)).all()
+        except Exception as e:
+            print("Ошибка загрузки объявлений для ленты:", e)
+            return
+        self.dispatch(ads)
+
+    def _received(self, connection, pid, channel, payload):
+        task = asyncio.get_running_loop().create_task(self._on_notify(payload))
+        self._loads.add(task)
+        task.add_done_callback(self._loads.discard)
+
+    async def _listen(self):
+        dsn = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+        while True:
+            try:
+                self._connection = await asyncpg.connect(dsn)
+                await self._connection.add_listener(CHANNEL, self._received)
+                # соединение держит asyncpg; проверяем, что оно живо
+                while not self._connection.is_closed():
+                    await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print("Ошибка LISTEN ленты объявлений:", e)
+            await asyncio.sleep(1)
+
+    def start(self):
+        if FEED_NOTIFY and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.close()
@@ -0,0 +1,68 @@
+from math import radians, degrees, sin, cos, asin, sqrt
+from sqlalchemy import and_, or_, func
+
+EARTH_RADIUS_KM = 6371.0
+DEFAULT_RADIUS_KM = 5
+
+
+def parse_point(values):
+    """[lat, lon] из фильтра или geoLocation -> (lat, lon) либо None."""
+    if not values or len(values) < 2:
+        return None
+    try:
+        lat, lon = float(values[0]), float(values[1])
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """Прямоугольник (min_lat, max_lat, min_lon, max_lon), гарантированно содержащий круг."""
+    angular = radius_km / EARTH_RADIUS_KM
+    dlat = degrees(angular)
+    min_lat, max_lat = lat - dlat, lat + dlat
+
+    if min_lat <= -90 or max_lat >= 90 or angular >= 1:
+        return max(min_lat, -90), min(max_lat, 90), -180.0, 180.0
+
+    dlon = degrees(asin(min(1.0, sin(angular) / cos(radians(lat)))))
+    return min_lat, max_lat, lon - dlon, lon + dlon
+
+
+def distance_km(lat_col, lon_col, lat, lon):
+    """SQL-выражение haversine от колонок до точки."""
+    dlat = func.radians(lat_col - lat)
+    dlon = func.radians(lon_col - lon)
+    a = func.power(func.sin(dlat * 0.5), 2) + func.cos(
+        func.radians(lat_col)
+    ) * cos(radians(lat)) * func.power(func.sin(dlon * 0.5), 2)
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(a)))
+
+
+def radius_filter(lat_col, lon_col, lat, lon, radius_km):
+    """
+    Условие поиска в радиусе и выражение расстояния для сортировки.
+    Прямоугольник отсекает строки по индексу (lat, lon), точное расстояние
+    считается только для оставшихся.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+
+    if min_lon < -180:
+        lon_cond = or_(lon_col >= min_lon + 360, lon_col <= max_lon)
+    elif max_lon > 180:
+        lon_cond = or_(lon_col >= min_lon, lon_col <= max_lon - 360)
+    else:
+        lon_cond = lon_col.between(min_lon, max_lon)
+
+    distance = distance_km(lat_col, lon_col, lat, lon)
+    condition = and_(lat_col.between(min_lat, max_lat), lon_cond, distance <= radius_km)
+    return condition, distance
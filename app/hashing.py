@@ -0,0 +1,104 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+from config import PASSWORD_POOL, PASSWORD_POOL_SIZE, PASSWORD_QUEUE_LIMIT, BCRYPT_ROUNDS
+
+_bcrypt = bcrypt.using(rounds=BCRYPT_ROUNDS)
+
+
+# функции верхнего уровня, чтобы их можно было передать в ProcessPoolExecutor
+def _hash(password):
+    return _bcrypt.hash(password)
+
+
+def _verify(password, hashed):
+    return _bcrypt.verify(password, hashed)
+
+
+def _load_backend():
+    # passlib выбирает и импортирует backend bcrypt при первом вызове
+    return _bcrypt.get_backend()
+
+
+def _timed(fn, *args):
+    started = time.monotonic()
+    result = fn(*args)
+    return result, started, time.monotonic()
+
+
+class PasswordHasher:
+    def __init__(self, pool: str, size: int, queue_limit: int):
+        if pool not in ("thread", "process"):
+            raise ValueError(f"Неизвестный PASSWORD_POOL: {pool}")
+        self.pool = pool
+        self.size = size
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self.stats = {
+            "calls": 0,
+            "rejected": 0,
+            "queued_seconds": 0.0,
+            "hashing_seconds": 0.0,
+        }
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.size)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.size, thread_name_prefix="bcrypt"
+                )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.queue_limit:
+            self.stats["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Сервер перегружен, попробуйте позже",
+                headers={"Retry-After": "1"},
+            )
+
+        self.pending += 1
+        submitted = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started, finished = await loop.run_in_executor(
+                self.executor, _timed, fn, *args
+            )
+        finally:
+            self.pending -= 1
+
+        self.stats["calls"] += 1
+        self.stats["queued_seconds"] += started - submitted
+        self.stats["hashing_seconds"] += finished - started
+        return result
+
+    async def hash(self, password):
+        return await self._run(_hash, password)
+
+    async def verify(self, password, hashed):
+        return await self._run(_verify, password, hashed)
+
+    async def warm_up(self):
+        """Создаёт пул и загружает bcrypt в каждом его потоке или процессе заранее."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self.executor, _load_backend) for _ in range(self.size))
+        )
+
+    def needs_rehash(self, hashed):
+        return _bcrypt.needs_update(hashed)
+
+
+hasher = PasswordHasher(PASSWORD_POOL, PASSWORD_POOL_SIZE, PASSWORD_QUEUE_LIMIT)
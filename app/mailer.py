@@ -0,0 +1,179 @@
+import asyncio
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from fastapi import HTTPException
+from config import (
+    SMTP,
+    EMAIL_QUEUE_SIZE,
+    EMAIL_BATCH_SIZE,
+    EMAIL_MAX_ATTEMPTS,
+    EMAIL_RETRY_BASE_SECONDS,
+)
+from database import new_session
+from models import FailedEmail
+
+
+class OutgoingEmail:
+    def __init__(self, recipient: str, msg: Message):
+        self.recipient = recipient
+        self.subject = str(msg["Subject"] or "")
+        self.message = msg.as_string()
+        self.attempts = 0
+        self.error = ""
+
+
+class Mailer:
+    """
+    Фоновая отправка писем: очередь, одно переиспользуемое SMTP-соединение
+    в отдельном потоке, пачки до EMAIL_BATCH_SIZE писем, повторы с
+    экспоненциальной задержкой и таблица failed_emails для неотправленного.
+    """
+
+    def __init__(self):
+        self.queue: asyncio.Queue[OutgoingEmail] | None = None
+        self.stats = {"sent": 0, "retried": 0, "dead": 0, "connects": 0}
+        # все обращения к smtplib идут из одного потока
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+        self._smtp: smtplib.SMTP | None = None
+        self._last_used = 0.0
+        self._task: asyncio.Task | None = None
+        self._retries: set[asyncio.TimerHandle] = set()
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=EMAIL_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10):
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print("Письма остались в очереди:", self.queue.qsize())
+        self._task.cancel()
+        for handle in self._retries:
+            handle.cancel()
+        self._task = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=False)
+
+    def enqueue(self, recipient: str, msg: Message):
+        if self.queue is None:
+            raise RuntimeError("Mailer не запущен")
+        try:
+            self.queue.put_nowait(OutgoingEmail(recipient, msg))
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=503,
+                detail="Не удалось отправить письмо, попробуйте позже",
+                headers={"Retry-After": "30"},
+            )
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < EMAIL_BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                failed = await loop.run_in_executor(self._executor, self._send_batch, batch)
+            except Exception as e:
+                for email in batch:
+                    email.error = str(e)
+                failed = batch
+
+            self.stats["sent"] += len(batch) - len(failed)
+            for email in failed:
+                await self._retry_or_bury(email)
+            for _ in batch:
+                self.queue.task_done()
+
+    async def _retry_or_bury(self, email: OutgoingEmail):
+        email.attempts += 1
+        if email.attempts >= EMAIL_MAX_ATTEMPTS:
+            self.stats["dead"] += 1
+            try:
+                async with new_session() as session:
+                    session.add(
+                        FailedEmail(
+                            recipient=email.recipient,
+                            subject=email.subject,
+                            message=email.message,
+                            error=email.error,
+                            attempts=email.attempts,
+                        )
+                    )
+                    await session.commit()
+            except Exception as e:
+                print("Ошибка записи в failed_emails:", e)
+            return
+
+        self.stats["retried"] += 1
+        delay = EMAIL_RETRY_BASE_SECONDS * 2 ** (email.attempts - 1)
+        handle = None
+
+        def requeue():
+            self._retries.discard(handle)
+            try:
+                self.queue.put_nowait(email)
+            except asyncio.QueueFull:
+                asyncio.ensure_future(self._retry_or_bury(email))
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._retries.add(handle)
+
+    # дальше всё выполняется в потоке smtp
+
+    def _connect(self):
+        smtp = smtplib.SMTP(SMTP.host, SMTP.port, timeout=30)
+        if SMTP.starttls:
+            smtp.starttls()
+        if SMTP.user:
+            smtp.login(SMTP.user, SMTP.password)
+        self.stats["connects"] += 1
+        return smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def _connection(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > SMTP.idle_seconds:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    self._close()
+            except (smtplib.SMTPException, OSError):
+                self._smtp = None
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def _send_batch(self, batch):
+        failed = []
+        for email in batch:
+            for reconnect in (False, True):
+                try:
+                    if reconnect:
+                        self._close()
+                    self._connection().sendmail(SMTP.email_from, email.recipient, email.message)
+                    self._last_used = time.monotonic()
+                    break
+                except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                    email.error = str(e)
+                    if reconnect:
+                        failed.append(email)
+                except (smtplib.SMTPException, OSError) as e:
+                    email.error = str(e)
+                    failed.append(email)
+                    break
+        return failed
+
+
+mailer = Mailer()
@@ -1,16 +1,62 @@
+import startup  # первым: отсчёт времени импорта
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 
-from database import engine, Base
-from routes import users, ad
+from archive import archiver
+from database import engine, warm_up
+from hashing import hasher
+from mailer import mailer
+from matching import matcher
+from migrations import migrate, check
+from revocation import revocations
+from metrics import MetricsMiddleware, install_sql_events, watch_loop_lag
+from config import (
+    STARTUP_MODE,
+    METRICS_ENABLED,
+    COMPRESSION,
+    COMPRESSION_MIN_SIZE,
+    GZIP_LEVEL,
+    BROTLI_QUALITY,
+    COMPRESSION_EXCLUDED_PATHS,
+)
+from compression import CompressionExcept
+from routes import users, ad, owner, archive, bulk, matches, photos, health, metrics
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if STARTUP_MODE == "production":
+        # схему меняет только python migrations.py: воркеры не ждут друг друга на DDL
+        await check(engine)
+    else:
+        await migrate(engine)
+    # независимые шаги параллельно; запросы пойдут, когда всё готово
+    await asyncio.gather(
+        warm_up(), hasher.warm_up(), revocations.start(), photos.thumbnailer.start()
+    )
+    startup.warm_up_tokens()
+    mailer.start()
+    ad.feed.start()
+    matcher.start()
+    archiver.start()
+    lag_watcher = asyncio.create_task(watch_loop_lag()) if METRICS_ENABLED else None
+    startup.ready()
     yield
+    startup.state["ready"] = False
+    if lag_watcher:
+        lag_watcher.cancel()
+    await revocations.stop()
+    await archiver.stop()
+    await photos.thumbnailer.stop()
+    await matcher.stop()
+    await ad.feed.stop()
+    await mailer.stop()
+    hasher.shutdown()
+    await engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan, version='0.9')
@@ -22,5 +68,41 @@ app.add_middleware(
     allow_headers=["*"],
     allow_methods=["*"],
 )
+if COMPRESSION == "brotli":
+    # пакет brotli-asgi (requirements-optional.txt); клиентам без br отдаёт gzip
+    from brotli_asgi import BrotliMiddleware
+
+    app.add_middleware(
+        CompressionExcept,
+        middleware=BrotliMiddleware,
+        excluded=COMPRESSION_EXCLUDED_PATHS,
+        quality=BROTLI_QUALITY,
+        minimum_size=COMPRESSION_MIN_SIZE,
+        gzip_fallback=True,
+    )
+elif COMPRESSION == "gzip":
+    app.add_middleware(
+        CompressionExcept,
+        middleware=GZipMiddleware,
+        excluded=COMPRESSION_EXCLUDED_PATHS,
+        minimum_size=COMPRESSION_MIN_SIZE,
+        compresslevel=GZIP_LEVEL,
+    )
+elif COMPRESSION != "off":
+    raise ValueError(f"Неизвестный COMPRESSION: {COMPRESSION}")
+
 app.include_router(users.router)
 app.include_router(ad.router)
+app.include_router(owner.router)
+app.include_router(archive.router)
+app.include_router(bulk.router)
+app.include_router(matches.router)
+app.include_router(photos.router)
+app.include_router(health.router)
+
+if METRICS_ENABLED:
+    install_sql_events(engine)
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
+
+startup.mark("imported")
@@ -0,0 +1,193 @@
+"""
+Фоновый поиск пар «потерялся — нашёлся».
+
+create_ad и импорт ставят id нового объявления в очередь и не ждут. Воркер
+выбирает кандидатов одним запросом по индексу (type, status, lat, lon):
+противоположный статус, тот же вид, совместимые порода и размер, в радиусе
+MATCH_RADIUS_KM (без координат — тот же регион) и в окне MATCH_WINDOW_DAYS.
+Кандидаты получают оценку 0..1, пары не ниже MATCH_MIN_SCORE сохраняются в
+ad_matches; с MATCH_EMAIL владельцам уходит письмо о новых совпадениях.
+"""
+import asyncio
+from datetime import timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import select, func, cast, null, Float
+from sqlalchemy.dialects.postgresql import insert
+
+from auth import send_match_email
+from config import (
+    MATCH_ENABLED,
+    MATCH_RADIUS_KM,
+    MATCH_WINDOW_DAYS,
+    MATCH_MIN_SCORE,
+    MATCH_CANDIDATES,
+    MATCH_QUEUE_SIZE,
+    MATCH_EMAIL,
+)
+from database import new_session
+from geo import radius_filter
+from models import Ad, AdMatch
+
+SIZES = ("little", "medium", "big")
+# «нашёлся» мог быть замечен чуть раньше, чем хозяин подал объявление
+EARLY_FOUND = timedelta(days=1)
+
+
+def compatible_sizes(size: str):
+    if size not in SIZES:
+        return [size]
+    i = SIZES.index(size)
+    return list(SIZES[max(0, i - 1) : i + 2])
+
+
+def candidates_query(ad: Ad):
+    """Кандидаты в пару для ad или None, если искать не по чему."""
+    lost = ad.status == "lost"
+    window = timedelta(days=MATCH_WINDOW_DAYS)
+    if lost:
+        time_range = (ad.time - EARLY_FOUND, ad.time + window)
+    else:
+        time_range = (ad.time - window, ad.time + EARLY_FOUND)
+
+    query = select(
+        Ad.id,
+        Ad.breed,
+        Ad.size,
+        Ad.time,
+        Ad.nickname,
+        Ad.contactEmail,
+        func.similarity(Ad.color, ad.color).label("color_similarity"),
+    ).where(
+        Ad.type == ad.type,
+        Ad.status == ("found" if lost else "lost"),
+        Ad.state == "active",
+        Ad.user_id != ad.user_id,
+        Ad.time.between(*time_range),
+        Ad.size.in_(compatible_sizes(ad.size)),
+    )
+    # метис совместим с любой породой
+    if ad.breed != "metis":
+        query = query.where(Ad.breed.in_([ad.breed, "metis"]))
+
+    if ad.lat is not None:
+        condition, distance = radius_filter(Ad.lat, Ad.lon, ad.lat, ad.lon, MATCH_RADIUS_KM)
+        query = query.add_columns(distance.label("distance_km")).where(condition)
+        query = query.order_by(distance)
+    elif ad.region:
+        query = query.add_columns(cast(null(), Float).label("distance_km"))
+        query = query.where(Ad.region == ad.region).order_by(Ad.created_at.desc())
+    else:
+        return None
+    return query.limit(MATCH_CANDIDATES)
+
+
+def score(ad: Ad, row):
+    if row.distance_km is not None:
+        total = 0.35 * max(0.0, 1 - row.distance_km / MATCH_RADIUS_KM)
+    else:
+        total = 0.15  # известен только регион
+    days = abs((row.time - ad.time).total_seconds()) / 86400
+    total += 0.15 * max(0.0, 1 - days / MATCH_WINDOW_DAYS)
+    total += 0.2 if row.breed == ad.breed else 0.1
+    total += 0.15 if row.size == ad.size else 0.05
+    total += 0.15 * (row.color_similarity or 0.0)
+    return round(total, 3)
+
+
+class Matcher:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.queue: asyncio.Queue[int] | None = None
+        self.stats = {"processed": 0, "matches": 0, "dropped": 0, "errors": 0}
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if not self.enabled:
+            return
+        self.queue = asyncio.Queue(maxsize=MATCH_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def enqueue(self, ad_ids):
+        """Не блокирует: при переполненной очереди объявление остаётся без поиска пары."""
+        if self.queue is None:
+            return
+        for ad_id in ad_ids:
+            try:
+                self.queue.put_nowait(ad_id)
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+
+    async def _run(self):
+        while True:
+            ad_id = await self.queue.get()
+            try:
+                await self.match(ad_id)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Ошибка поиска совпадений для объявления {ad_id}:", e)
+            finally:
+                self.queue.task_done()
+
+    async def match(self, ad_id: int):
+        async with new_session() as session:
+            ad = await session.get(Ad, ad_id)
+            if ad is None:
+                return
+            query = candidates_query(ad)
+            if query is None:
+                return
+            rows = (await session.execute(query)).all()
+
+            found = [(row, score(ad, row)) for row in rows]
+            found = [(row, value) for row, value in found if value >= MATCH_MIN_SCORE]
+            self.stats["processed"] += 1
+            if not found:
+                return
+
+            lost = ad.status == "lost"
+            values = [
+                {
+                    "lost_ad_id": ad.id if lost else row.id,
+                    "found_ad_id": row.id if lost else ad.id,
+                    "score": value,
+                    "distance_km": row.distance_km,
+                }
+                for row, value in found
+            ]
+            # пара могла появиться при обработке второго объявления
+            inserted = await session.execute(
+                insert(AdMatch)
+                .on_conflict_do_nothing(constraint="uq_ad_matches_pair")
+                .returning(AdMatch.lost_ad_id, AdMatch.found_ad_id),
+                values,
+            )
+            new_pairs = {tuple(pair) for pair in inserted}
+            await session.commit()
+
+        self.stats["matches"] += len(new_pairs)
+        if MATCH_EMAIL and new_pairs:
+            new = [
+                (row, value)
+                for row, value in found
+                if ((ad.id, row.id) if lost else (row.id, ad.id)) in new_pairs
+            ]
+            await self.notify(ad, new)
+
+    async def notify(self, ad: Ad, found):
+        letters = [(ad.contactEmail, ad, [(row.id, value) for row, value in found])]
+        letters += [(row.contactEmail, row, [(ad.id, value)]) for row, value in found]
+        for email, subject_ad, matches in letters:
+            try:
+                await send_match_email(email, subject_ad, matches)
+            except HTTPException:
+                # очередь писем полна: совпадение всё равно видно в GET /ads/matches
+                pass
+
+
+matcher = Matcher(MATCH_ENABLED)
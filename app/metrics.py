@@ -0,0 +1,150 @@
+import asyncio
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from sqlalchemy import event
+from config import SLOW_QUERY_MS, LOOP_LAG_INTERVAL
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [счётчики по корзинам..., +Inf, сумма]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels(key, le=bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {series[-1]}")
+            lines.append(f"{self.name}_count{format_labels(key)} {cumulative}")
+        return lines
+
+
+def format_labels(key=(), **extra):
+    items = list(key) + list(extra.items())
+    if not items:
+        return ""
+    inner = ",".join(f'{name}="{str(value).replace(chr(34), "")}"' for name, value in items)
+    return "{" + inner + "}"
+
+
+def render_gauges(name: str, help: str, values: dict, type="gauge"):
+    """values: {labels-tuple: значение}."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+    for key, value in values.items():
+        lines.append(f"{name}{format_labels(key)} {value}")
+    return lines
+
+
+request_latency = Histogram("http_request_duration_seconds", "Время обработки запроса")
+request_queries = Histogram(
+    "http_request_db_queries", "SQL-запросов на HTTP-запрос", buckets=COUNT_BUCKETS
+)
+request_db_time = Histogram("http_request_db_seconds", "Время SQL на HTTP-запрос")
+query_latency = Histogram("db_query_duration_seconds", "Время одного SQL-запроса")
+loop_lag = Histogram(
+    "event_loop_lag_seconds",
+    "Задержка event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+slow_queries = {(): 0}
+current_loop_lag = {(): 0.0}
+
+# [число запросов, время] текущего HTTP-запроса
+_request_sql: ContextVar[list | None] = ContextVar("request_sql", default=None)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        sql = [0, 0.0]
+        token = _request_sql.set(sql)
+        status = {"code": 500}
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", []))
+                timing = f"db;desc=\"{sql[0]} queries\";dur={sql[1] * 1000:.1f}"
+                headers.append((b"server-timing", timing.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_sql.reset(token)
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            request_latency.observe(
+                elapsed, method=scope["method"], route=path, status=status["code"]
+            )
+            request_queries.observe(sql[0], route=path)
+            request_db_time.observe(sql[1], route=path)
+
+
+def install_sql_events(engine):
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        query_latency.observe(elapsed)
+
+        sql = _request_sql.get()
+        if sql is not None:
+            sql[0] += 1
+            sql[1] += elapsed
+
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_queries[()] += 1
+            # без параметров: в них email, телефоны, хэши паролей
+            print(f"Медленный запрос {elapsed * 1000:.0f} мс: {' '.join(statement.split())}")
+
+
+async def watch_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, loop.time() - started - LOOP_LAG_INTERVAL)
+        current_loop_lag[()] = lag
+        loop_lag.observe(lag)
+
+
+def render(extra_lines=()):
+    lines = []
+    for histogram in (request_latency, request_queries, request_db_time, query_latency, loop_lag):
+        lines += histogram.render()
+    lines += render_gauges("db_slow_queries_total", "Медленные SQL-запросы", slow_queries, "counter")
+    lines += render_gauges("event_loop_lag_last_seconds", "Последний замер задержки", current_loop_lag)
+    lines += list(extra_lines)
+    return "\n".join(lines) + "\n"
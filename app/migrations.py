@@ -0,0 +1,460 @@
+"""
+Миграции схемы вместо Base.metadata.create_all.
+
+Каждая миграция — версия, описание и список SQL-выражений. Обычные миграции
+выполняются в одной транзакции; с transactional=False — по одному выражению
+в autocommit (нужно для CREATE INDEX CONCURRENTLY). Выражения пишутся
+идемпотентно (IF NOT EXISTS), поэтому базы, созданные через create_all,
+подхватываются без ручных действий. Индекс, оставшийся INVALID после
+прерванного CREATE INDEX CONCURRENTLY, при следующем запуске удаляется и
+строится заново.
+
+    cd app && python migrations.py          # применить
+    cd app && python migrations.py status   # показать состояние
+    cd app && python migrations.py check    # код 1, если есть неприменённые
+
+С STARTUP_MODE=production воркеры не мигрируют, а только вызывают check():
+миграции применяются один раз перед запуском (или выкаткой) воркеров.
+"""
+import asyncio
+import re
+import sys
+from sqlalchemy import text
+from models import SEARCH_VECTOR_SQL
+
+# произвольная константа для pg_advisory_lock: воркеры не мигрируют параллельно
+LOCK_KEY = 815_730_001
+LOCK_POLL_SECONDS = 0.5
+INDEX_NAME = re.compile(r"CREATE (?:UNIQUE )?INDEX (?:CONCURRENTLY )?IF NOT EXISTS (\w+)")
+
+
+class Migration:
+    def __init__(self, version: str, name: str, statements: list[str], transactional=True):
+        self.version = version
+        self.name = name
+        self.statements = statements
+        self.transactional = transactional
+
+
+MIGRATIONS = [
+    Migration(
+        "0001",
+        "Исходная схема",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                email VARCHAR NOT NULL,
+                password_hash VARCHAR NOT NULL,
+                phone VARCHAR,
+                name VARCHAR,
+                role VARCHAR NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                CONSTRAINT users_email_key UNIQUE (email)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS ads (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+                status VARCHAR(10) NOT NULL,
+                type VARCHAR(10) NOT NULL,
+                breed VARCHAR(30) NOT NULL,
+                color VARCHAR(20) NOT NULL,
+                size VARCHAR(10) NOT NULL,
+                distincts TEXT NOT NULL,
+                nickname VARCHAR(50) NOT NULL,
+                danger VARCHAR(10) NOT NULL,
+                location VARCHAR(100) NOT NULL,
+                "geoLocation" FLOAT[] NOT NULL,
+                time TIMESTAMP WITH TIME ZONE NOT NULL,
+                "contactName" VARCHAR(50) NOT NULL,
+                "contactPhone" VARCHAR(20) NOT NULL,
+                "contactEmail" VARCHAR(100) NOT NULL,
+                extras TEXT NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS failed_emails (
+                id SERIAL PRIMARY KEY,
+                recipient VARCHAR(100) NOT NULL,
+                subject VARCHAR(200) NOT NULL,
+                message TEXT NOT NULL,
+                error TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+            """,
+        ],
+    ),
+    Migration(
+        "0002",
+        "Координаты объявлений для поиска по радиусу",
+        [
+            "ALTER TABLE ads ADD COLUMN IF NOT EXISTS lat FLOAT",
+            "ALTER TABLE ads ADD COLUMN IF NOT EXISTS lon FLOAT",
+            """
+            UPDATE ads SET lat = "geoLocation"[1], lon = "geoLocation"[2]
+            WHERE lat IS NULL AND array_length("geoLocation", 1) >= 2
+            """,
+        ],
+    ),
+    Migration(
+        "0003",
+        "Индексы под фильтры и сортировку объявлений",
+        [
+            # без фильтров и с частыми фильтрами (status/type ~50%):
+            # обратный проход по индексу с остановкой на LIMIT
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_created_at_id "
+            "ON ads (created_at, id)",
+            # самая частая комбинация: «потерялись собаки», «нашлись кошки»
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_status_type_created_at "
+            "ON ads (status, type, created_at, id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_breed_created_at "
+            "ON ads (breed, created_at, id)",
+            # опасных животных мало, частичный индекс почти ничего не стоит
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_danger_created_at "
+            "ON ads (created_at, id) WHERE danger = 'danger'",
+            # GET /ads/my
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_user_id_created_at "
+            "ON ads (user_id, created_at, id)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_lat_lon ON ads (lat, lon)",
+            "ANALYZE ads",
+        ],
+        transactional=False,
+    ),
+    Migration(
+        "0004",
+        "Версия токенов пользователя",
+        [
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0",
+        ],
+    ),
+    Migration(
+        "0005",
+        "Полнотекстовый поиск по объявлениям",
+        [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            # перезаписывает таблицу: на большой базе выполнять в окно обслуживания
+            f"""
+            ALTER TABLE ads ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS ({SEARCH_VECTOR_SQL}) STORED
+            """,
+        ],
+    ),
+    Migration(
+        "0006",
+        "Индексы полнотекстового и нечёткого поиска",
+        [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_search_vector "
+            "ON ads USING gin (search_vector)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_nickname_trgm "
+            "ON ads USING gin (nickname gin_trgm_ops)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_color_trgm "
+            "ON ads USING gin (color gin_trgm_ops)",
+            "ANALYZE ads",
+        ],
+        transactional=False,
+    ),
+    Migration(
+        "0007",
+        "Регион объявления",
+        [
+            # заполнение старых строк: python regions.py backfill
+            "ALTER TABLE ads ADD COLUMN IF NOT EXISTS region VARCHAR(10)",
+        ],
+    ),
+    Migration(
+        "0008",
+        "Индекс по региону",
+        [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_region_created_at "
+            "ON ads (region, created_at, id)",
+        ],
+        transactional=False,
+    ),
+    Migration(
+        "0009",
+        "Совпадения объявлений «потерялся — нашёлся»",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS ad_matches (
+                id SERIAL PRIMARY KEY,
+                lost_ad_id INTEGER NOT NULL REFERENCES ads (id) ON DELETE CASCADE,
+                found_ad_id INTEGER NOT NULL REFERENCES ads (id) ON DELETE CASCADE,
+                score FLOAT NOT NULL,
+                distance_km FLOAT,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                CONSTRAINT uq_ad_matches_pair UNIQUE (lost_ad_id, found_ad_id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_ad_matches_found_ad_id ON ad_matches (found_ad_id)",
+        ],
+    ),
+    Migration(
+        "0010",
+        "Индекс кандидатов для совпадений",
+        [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_type_status_lat_lon "
+            "ON ads (type, status, lat, lon)",
+        ],
+        transactional=False,
+    ),
+    Migration(
+        "0011",
+        "Отозванные токены",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS revocations (
+                id SERIAL PRIMARY KEY,
+                jti VARCHAR(64),
+                user_id INTEGER,
+                min_version INTEGER,
+                expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+            """,
+        ],
+    ),
+    Migration(
+        "0012",
+        "Фото объявлений",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS ad_photos (
+                id SERIAL PRIMARY KEY,
+                ad_id INTEGER NOT NULL REFERENCES ads (id) ON DELETE CASCADE,
+                sha256 VARCHAR(64) NOT NULL,
+                content_type VARCHAR(20) NOT NULL,
+                size INTEGER NOT NULL,
+                position INTEGER NOT NULL DEFAULT 0,
+                ready BOOLEAN NOT NULL DEFAULT FALSE,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                CONSTRAINT uq_ad_photos_ad_sha256 UNIQUE (ad_id, sha256)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_ad_photos_ad_id_position ON ad_photos (ad_id, position)",
+            "CREATE INDEX IF NOT EXISTS ix_ad_photos_sha256 ON ad_photos (sha256)",
+        ],
+    ),
+    Migration(
+        "0013",
+        "Состояние объявления и архив",
+        [
+            # значение по умолчанию без перезаписи таблицы (PostgreSQL 11+)
+            "ALTER TABLE ads ADD COLUMN IF NOT EXISTS state VARCHAR(10) NOT NULL DEFAULT 'active'",
+            "ALTER TABLE ads ADD COLUMN IF NOT EXISTS closed_at TIMESTAMP WITH TIME ZONE",
+            """
+            CREATE TABLE IF NOT EXISTS ads_archive (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+                status VARCHAR(10) NOT NULL,
+                type VARCHAR(10) NOT NULL,
+                breed VARCHAR(30) NOT NULL,
+                color VARCHAR(20) NOT NULL,
+                size VARCHAR(10) NOT NULL,
+                distincts TEXT NOT NULL,
+                nickname VARCHAR(50) NOT NULL,
+                danger VARCHAR(10) NOT NULL,
+                location VARCHAR(100) NOT NULL,
+                region VARCHAR(10),
+                "geoLocation" FLOAT[] NOT NULL,
+                lat FLOAT,
+                lon FLOAT,
+                time TIMESTAMP WITH TIME ZONE NOT NULL,
+                "contactName" VARCHAR(50) NOT NULL,
+                "contactPhone" VARCHAR(20) NOT NULL,
+                "contactEmail" VARCHAR(100) NOT NULL,
+                extras TEXT NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                state VARCHAR(10) NOT NULL,
+                closed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                archived_at TIMESTAMP WITH TIME ZONE NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_ads_archive_user_id_archived_at "
+            "ON ads_archive (user_id, archived_at, id)",
+            # фото остаются у объявления и после переноса в архив
+            "ALTER TABLE ad_photos DROP CONSTRAINT IF EXISTS ad_photos_ad_id_fkey",
+        ],
+    ),
+    Migration(
+        "0014",
+        "Индекс закрытых объявлений",
+        [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_ads_closed_at "
+            "ON ads (closed_at) WHERE state <> 'active'",
+        ],
+        transactional=False,
+    ),
+    Migration(
+        "0015",
+        "Время изменения объявлений",
+        [
+            # DEFAULT now() стабилен в пределах транзакции: PostgreSQL 11+ не
+            # переписывает таблицу; старым строкам достаётся время миграции
+            "ALTER TABLE ads ADD COLUMN IF NOT EXISTS updated_at "
+            "TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()",
+            "ALTER TABLE ads_archive ADD COLUMN IF NOT EXISTS updated_at "
+            "TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()",
+        ],
+    ),
+    Migration(
+        "0016",
+        "Совпадения переживают перенос в архив",
+        [
+            # иначе архиватор каскадом удаляет пары вместе со строкой из ads
+            "ALTER TABLE ad_matches DROP CONSTRAINT IF EXISTS ad_matches_lost_ad_id_fkey",
+            "ALTER TABLE ad_matches DROP CONSTRAINT IF EXISTS ad_matches_found_ad_id_fkey",
+        ],
+    ),
+    Migration(
+        "0017",
+        "Окно синхронизации и поиск отозванных токенов",
+        [
+            "ALTER TABLE revocations ADD COLUMN IF NOT EXISTS created_at "
+            "TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()",
+            # таблица маленькая: в ней только неистёкшие отзывы
+            "CREATE INDEX IF NOT EXISTS ix_revocations_created_at ON revocations (created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_revocations_jti ON revocations (jti)",
+            "CREATE INDEX IF NOT EXISTS ix_revocations_user_id ON revocations (user_id)",
+        ],
+    ),
+    Migration(
+        "0018",
+        "Время удаления объявлений пользователя",
+        [
+            "ALTER TABLE users ADD COLUMN IF NOT EXISTS ads_removed_at TIMESTAMP WITH TIME ZONE",
+        ],
+    ),
+]
+
+
+async def applied_versions(conn):
+    await conn.execute(
+        text(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version VARCHAR(20) PRIMARY KEY,
+                name VARCHAR(200) NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+            )
+            """
+        )
+    )
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return {row[0] for row in result}
+
+
+async def apply(engine, migration: Migration):
+    record = text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)")
+    params = {"version": migration.version, "name": migration.name}
+
+    if migration.transactional:
+        async with engine.begin() as conn:
+            for statement in migration.statements:
+                await conn.execute(text(statement))
+            await conn.execute(record, params)
+        return
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in migration.statements:
+            await conn.execute(text(statement))
+        await conn.execute(record, params)
+
+
+async def acquire_lock(conn):
+    # не блокирующий pg_advisory_lock: ждущий воркер держал бы снимок открытого
+    # запроса, а CREATE INDEX CONCURRENTLY лидера ждёт все такие снимки
+    while not await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": LOCK_KEY}):
+        await asyncio.sleep(LOCK_POLL_SECONDS)
+
+
+async def invalid_indexes(conn) -> set[str]:
+    """Индексы, оставшиеся INVALID после прерванного CREATE INDEX CONCURRENTLY."""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE NOT i.indisvalid"
+        )
+    )
+    return {row[0] for row in result}
+
+
+async def rebuild_invalid(engine, invalid: set[str]):
+    """IF NOT EXISTS пропускает недостроенный индекс: удаляем и строим заново."""
+    for migration in MIGRATIONS:
+        for statement in migration.statements:
+            match = INDEX_NAME.search(statement)
+            if not match or match.group(1) not in invalid:
+                continue
+            print(f"Индекс {match.group(1)} INVALID, перестраивается")
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}"))
+                await conn.execute(text(statement))
+
+
+async def migrate(engine):
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        await acquire_lock(lock_conn)
+        try:
+            applied = await applied_versions(lock_conn)
+            # и у применённых миграций: их CREATE INDEX мог быть прерван
+            await rebuild_invalid(engine, await invalid_indexes(lock_conn))
+            for migration in MIGRATIONS:
+                if migration.version in applied:
+                    continue
+                print(f"Миграция {migration.version}: {migration.name}")
+                await apply(engine, migration)
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+
+
+async def pending(engine):
+    """Неприменённые миграции; только чтение, без DDL."""
+    async with engine.connect() as conn:
+        applied = set()
+        if await conn.scalar(text("SELECT to_regclass('schema_migrations') IS NOT NULL")):
+            applied = set(await conn.scalars(text("SELECT version FROM schema_migrations")))
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+async def check(engine):
+    missing = await pending(engine)
+    if missing:
+        versions = ", ".join(migration.version for migration in missing)
+        raise RuntimeError(f"Не применены миграции {versions}: запустите python migrations.py")
+
+
+async def status(engine):
+    async with engine.connect() as conn:
+        applied = await applied_versions(conn)
+        await conn.commit()
+    for migration in MIGRATIONS:
+        mark = "x" if migration.version in applied else " "
+        print(f"[{mark}] {migration.version} {migration.name}")
+
+
+async def main(command: str):
+    from database import engine
+
+    try:
+        if command == "status":
+            await status(engine)
+        elif command == "check":
+            try:
+                await check(engine)
+            except RuntimeError as e:
+                print(e)
+                sys.exit(1)
+        else:
+            await migrate(engine)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "migrate"))
@@ -1,5 +1,18 @@
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy import DateTime, String, Text, ForeignKey, ARRAY, Float
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy import (
+    DateTime,
+    String,
+    Text,
+    ForeignKey,
+    ARRAY,
+    Float,
+    Index,
+    Boolean,
+    Computed,
+    UniqueConstraint,
+    text,
+)
 from database import Base
 from datetime import datetime, timezone
 from typing import Optional
@@ -9,11 +22,18 @@ class User(Base):
     __tablename__ = "users"
 
     id: Mapped[int] = mapped_column(primary_key=True)
+    # users_email_key (unique) обслуживает все поиски по email
     email: Mapped[str] = mapped_column(unique=True)
     password_hash: Mapped[str]
     phone: Mapped[Optional[str]] = mapped_column(default="")
     name: Mapped[Optional[str]] = mapped_column(nullable=True)
     role: Mapped[str] = mapped_column(default="user")
+    # попадает в токены как "ver"
+    token_version: Mapped[int] = mapped_column(default=0, server_default="0")
+    # последнее удаление или перенос в архив объявлений; Last-Modified /ads/my
+    ads_removed_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         default=lambda: datetime.now(timezone.utc),
@@ -21,10 +41,17 @@ class User(Base):
     )
 
 
-class Ad(Base):
-    __tablename__ = "ads"
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', nickname), 'A') || "
+    "setweight(to_tsvector('russian', distincts), 'B') || "
+    "setweight(to_tsvector('russian', color || ' ' || location), 'C') || "
+    "setweight(to_tsvector('russian', extras), 'D')"
+)
+
+
+class AdColumns:
+    """Колонки объявления, общие для ads и ads_archive."""
 
-    id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
 
     status: Mapped[str] = mapped_column(String(10))
@@ -36,15 +63,167 @@ class Ad(Base):
     nickname: Mapped[str] = mapped_column(String(50), default="")
     danger: Mapped[str] = mapped_column(String(10))
     location: Mapped[str] = mapped_column(String(100), default="")
+    # код ISO 3166-2:RU, вычисляется один раз в create_ad (см. regions.py)
+    region: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)
     geoLocation: Mapped[ARRAY[float]] = mapped_column(
         ARRAY(Float, as_tuple=True), default=[]
     )
+    # копия geoLocation для индексного поиска по радиусу
+    lat: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    lon: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     time: Mapped[datetime] = mapped_column(DateTime(timezone=True))
     contactName: Mapped[str] = mapped_column(String(50))
     contactPhone: Mapped[str] = mapped_column(String(20))
     contactEmail: Mapped[str] = mapped_column(String(100))
     extras: Mapped[str] = mapped_column(Text, default="")
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+    # любая правка владельцем, в том числе смена state и фото; версия страниц
+    # /ads и /ads/my
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=text("now()"),
+    )
+
+
+class Ad(AdColumns, Base):
+    __tablename__ = "ads"
+    # должны совпадать с migrations.py
+    __table_args__ = (
+        Index("ix_ads_created_at_id", "created_at", "id"),
+        Index("ix_ads_status_type_created_at", "status", "type", "created_at", "id"),
+        Index("ix_ads_breed_created_at", "breed", "created_at", "id"),
+        Index(
+            "ix_ads_danger_created_at",
+            "created_at",
+            "id",
+            postgresql_where=text("danger = 'danger'"),
+        ),
+        Index("ix_ads_user_id_created_at", "user_id", "created_at", "id"),
+        Index("ix_ads_region_created_at", "region", "created_at", "id"),
+        Index("ix_ads_lat_lon", "lat", "lon"),
+        # кандидаты для matching.py: противоположный статус рядом
+        Index("ix_ads_type_status_lat_lon", "type", "status", "lat", "lon"),
+        # закрытые, которые ждут переноса в архив
+        Index("ix_ads_closed_at", "closed_at", postgresql_where=text("state <> 'active'")),
+        Index("ix_ads_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_ads_nickname_trgm",
+            "nickname",
+            postgresql_using="gin",
+            postgresql_ops={"nickname": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_ads_color_trgm",
+            "color",
+            postgresql_using="gin",
+            postgresql_ops={"color": "gin_trgm_ops"},
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # active, resolved (питомец нашёлся), closed; список /ads — только active
+    state: Mapped[str] = mapped_column(String(10), default="active", server_default="active")
+    closed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # поддерживает сама БД; в ORM-объекты не грузится
+    search_vector = mapped_column(
+        TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True), deferred=True
+    )
+
+
+class ArchivedAd(AdColumns, Base):
+    """Закрытое или устаревшее объявление, перенесённое из ads (см. archive.py)."""
+
+    __tablename__ = "ads_archive"
+    __table_args__ = (Index("ix_ads_archive_user_id_archived_at", "user_id", "archived_at", "id"),)
+
+    # id из ads сохраняется: на него ссылаются ad_photos и старые ссылки
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    # resolved, closed или expired
+    state: Mapped[str] = mapped_column(String(10))
+    closed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+class AdMatch(Base):
+    """Пара «потерялся — нашёлся», найденная matching.py."""
+
+    __tablename__ = "ad_matches"
+    __table_args__ = (
+        UniqueConstraint("lost_ad_id", "found_ad_id", name="uq_ad_matches_pair"),
+        Index("ix_ad_matches_found_ad_id", "found_ad_id"),
+    )
 
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # без внешних ключей: объявление пары может быть в ads или в ads_archive;
+    # строки удаляются вместе с объявлением (routes/owner.py, DELETE /user)
+    lost_ad_id: Mapped[int]
+    found_ad_id: Mapped[int]
+    score: Mapped[float] = mapped_column(Float)
+    distance_km: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+
+
+class AdPhoto(Base):
+    """Фото объявления; файл хранится по sha256 содержимого (см. storage.py)."""
+
+    __tablename__ = "ad_photos"
+    __table_args__ = (
+        UniqueConstraint("ad_id", "sha256", name="uq_ad_photos_ad_sha256"),
+        Index("ix_ad_photos_ad_id_position", "ad_id", "position"),
+        Index("ix_ad_photos_sha256", "sha256"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # объявление в ads или ads_archive, поэтому без внешнего ключа;
+    # при удалении объявления фото удаляются явно
+    ad_id: Mapped[int]
+    sha256: Mapped[str] = mapped_column(String(64))
+    content_type: Mapped[str] = mapped_column(String(20))
+    size: Mapped[int]
+    position: Mapped[int] = mapped_column(default=0)
+    # превью готовы: фото попадает в AdOut.photos
+    ready: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+
+
+class Revocation(Base):
+    """Отозванный токен (jti) или все токены пользователя ниже min_version."""
+
+    __tablename__ = "revocations"
+    __table_args__ = (
+        Index("ix_revocations_created_at", "created_at"),
+        # проверка в БД, когда список в памяти переполнен
+        Index("ix_revocations_jti", "jti"),
+        Index("ix_revocations_user_id", "user_id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    jti: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    user_id: Mapped[Optional[int]] = mapped_column(nullable=True)
+    min_version: Mapped[Optional[int]] = mapped_column(nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    # начало транзакции по часам БД: окно перечитывания в RevocationList.sync
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=text("now()")
+    )
+
+
+class FailedEmail(Base):
+    __tablename__ = "failed_emails"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    recipient: Mapped[str] = mapped_column(String(100))
+    subject: Mapped[str] = mapped_column(String(200))
+    message: Mapped[str] = mapped_column(Text)
+    error: Mapped[str] = mapped_column(Text, default="")
+    attempts: Mapped[int] = mapped_column(default=0)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
@@ -0,0 +1,35 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+
+
+def encode_cursor(key, id: int) -> str:
+    if isinstance(key, datetime):
+        payload = {"t": key.isoformat(), "id": id}
+    else:
+        payload = {"k": key, "id": id}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """Курсор -> (ключ сортировки, id последней строки предыдущей страницы)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if "t" in payload:
+            key = datetime.fromisoformat(payload["t"])
+        else:
+            key = float(payload["k"])
+        return key, int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Неверный курсор")
+
+
+def next_cursor(rows, limit: int):
+    """rows — строки с колонками id и sort_key, выбранные с limit + 1."""
+    if len(rows) <= limit:
+        return None
+    row = rows[limit - 1]
+    return encode_cursor(row.sort_key, row.id)
@@ -0,0 +1,227 @@
+"""
+Фото объявлений: приём загрузки, превью в пуле процессов, URL для списков.
+
+Загрузка идёт потоком в storage.py, файл получает имя по sha256, так что
+одинаковые фото хранятся и обрабатываются один раз. Уменьшенные копии
+(SIZES) делает Pillow в ProcessPoolExecutor: запрос их не ждёт, строка
+ad_photos получает ready=true, когда копии записаны. Списки отдают только
+URL превью (thumb); исходник наружу не отдаётся — в нём EXIF с координатами.
+"""
+import asyncio
+import hashlib
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, func, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from config import (
+    STORAGE,
+    PHOTO_MAX_BYTES,
+    PHOTO_POOL_SIZE,
+    PHOTO_QUEUE_SIZE,
+    THUMBNAIL_SIZE,
+    PREVIEW_SIZE,
+)
+from database import new_session
+from models import Ad, AdPhoto
+from storage import storage
+
+# вид копии -> размер по длинной стороне
+SIZES = {"thumb": THUMBNAIL_SIZE, "preview": PREVIEW_SIZE}
+# сигнатура в начале файла -> content type
+SIGNATURES = {
+    b"\xff\xd8\xff": "image/jpeg",
+    b"\x89PNG\r\n\x1a\n": "image/png",
+}
+HEAD_BYTES = 12
+
+
+def original_key(sha256: str) -> str:
+    return f"original/{sha256[:2]}/{sha256}"
+
+
+def copy_key(kind: str, sha256: str) -> str:
+    return f"{kind}/{sha256[:2]}/{sha256}.jpg"
+
+
+def photo_url(kind: str, sha256: str) -> str:
+    return f"{STORAGE.url_prefix}{kind}/{sha256}.jpg"
+
+
+def detect_type(head: bytes):
+    for signature, content_type in SIGNATURES.items():
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def thumbnails_column(entity=Ad):
+    """URL превью готовых фото объявления по порядку; для select(...).
+
+    entity — модель, aliased() или подзапрос с колонкой id.
+    """
+    ad_id = entity.c.id if hasattr(entity, "c") else entity.id
+    urls = func.array_agg(
+        aggregate_order_by(
+            func.concat(STORAGE.url_prefix + "thumb/", AdPhoto.sha256, ".jpg"),
+            AdPhoto.position,
+            AdPhoto.id,
+        )
+    )
+    subquery = (
+        select(urls)
+        .where(AdPhoto.ad_id == ad_id, AdPhoto.ready)
+        .correlate(entity)
+        .scalar_subquery()
+    )
+    return func.coalesce(subquery, literal_column("'{}'::text[]")).label("photos")
+
+
+async def receive(chunks, upload):
+    """Пишет тело запроса в upload; (sha256, content type, размер) или HTTPException."""
+    digest = hashlib.sha256()
+    head = b""
+    content_type = None
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > PHOTO_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Файл слишком большой")
+        if content_type is None:
+            head += chunk[:HEAD_BYTES]
+            if len(head) >= HEAD_BYTES:
+                content_type = detect_type(head)
+                if content_type is None:
+                    raise HTTPException(status_code=415, detail="Поддерживаются JPEG, PNG и WebP")
+        digest.update(chunk)
+        await upload.write(chunk)
+    if content_type is None:
+        raise HTTPException(status_code=415, detail="Поддерживаются JPEG, PNG и WebP")
+    return digest.hexdigest(), content_type, size
+
+
+# функция верхнего уровня, чтобы её можно было передать в ProcessPoolExecutor
+def render_copies(data: bytes, sizes: list[int]) -> list[bytes]:
+    """JPEG-копии data, вписанные в квадраты sizes; без EXIF исходника."""
+    from PIL import Image, ImageOps
+
+    largest = max(sizes)
+    with Image.open(io.BytesIO(data)) as source:
+        # JPEG декодируется сразу уменьшенным в 2^n раз
+        source.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(source)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+
+    copies = {}
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=85, optimize=True, progressive=True)
+        copies[size] = buffer.getvalue()
+    return [copies[size] for size in sizes]
+
+
+async def copies_ready(sha256: str) -> bool:
+    for kind in SIZES:
+        if not await storage.exists(copy_key(kind, sha256)):
+            return False
+    return True
+
+
+async def touch_ads(session, ad_ids):
+    """Фото видны в списках: меняется версия страниц с этими объявлениями."""
+    await session.execute(
+        update(Ad)
+        .where(Ad.id.in_(ad_ids))
+        .values(updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+class Thumbnailer:
+    def __init__(self, size: int, on_ready):
+        # on_ready(ads) — после того как фото объявлений стали видны в списках
+        self.size = size
+        self.on_ready = on_ready
+        self.queue: asyncio.Queue[str] | None = None
+        self.stats = {"rendered": 0, "deduplicated": 0, "failed": 0, "dropped": 0}
+        self._executor = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        self._executor = ProcessPoolExecutor(max_workers=self.size)
+        self.queue = asyncio.Queue(maxsize=PHOTO_QUEUE_SIZE)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.size)]
+        # фото, загруженные до перезапуска
+        async with new_session() as session:
+            pending = await session.scalars(
+                select(AdPhoto.sha256).where(AdPhoto.ready.is_(False)).distinct()
+            )
+            self.enqueue(pending.all())
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def enqueue(self, hashes):
+        """Не блокирует: при переполненной очереди фото ждёт следующего запуска."""
+        if self.queue is None:
+            return
+        for sha256 in hashes:
+            try:
+                self.queue.put_nowait(sha256)
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+
+    async def _run(self):
+        while True:
+            sha256 = await self.queue.get()
+            try:
+                await self.process(sha256)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"Ошибка обработки фото {sha256}:", e)
+            finally:
+                self.queue.task_done()
+
+    async def process(self, sha256: str):
+        if await copies_ready(sha256):
+            self.stats["deduplicated"] += 1
+        else:
+            data = await storage.read(original_key(sha256))
+            loop = asyncio.get_running_loop()
+            copies = await loop.run_in_executor(
+                self._executor, render_copies, data, list(SIZES.values())
+            )
+            for kind, copy in zip(SIZES, copies):
+                await storage.write(copy_key(kind, sha256), copy)
+            self.stats["rendered"] += 1
+
+        async with new_session() as session:
+            ad_ids = await session.scalars(
+                update(AdPhoto)
+                .where(AdPhoto.sha256 == sha256, AdPhoto.ready.is_(False))
+                .values(ready=True)
+                .returning(AdPhoto.ad_id)
+            )
+            ad_ids = ad_ids.all()
+            if not ad_ids:
+                return
+            await touch_ads(session, ad_ids)
+            await session.commit()
+            ads = (await session.scalars(select(Ad).where(Ad.id.in_(ad_ids)))).all()
+        await self.on_ready(ads)
@@ -0,0 +1,155 @@
+"""
+Ограничение частоты для дорогих запросов (bcrypt, отправка писем).
+
+Token bucket по IP (зависимость rate_limit на маршруте) и по аккаунту
+(limiter.check_account в обработчике). Запрос списывает из корзины свою
+стоимость COSTS; пустая корзина — 429 с Retry-After. Корзины живут в памяти
+процесса или в Redis (RATE_LIMIT_URL), чтобы лимит был общим для воркеров.
+
+Перед лимитами работает сброс нагрузки: если event loop отстаёт, очередь
+bcrypt или писем почти полна, дорогой запрос сразу получает 503 и не
+занимает место, которое нужно уже принятым.
+"""
+import math
+import time
+from collections import OrderedDict
+from fastapi import Depends, HTTPException, Request
+
+from config import RATE_LIMIT, EMAIL_QUEUE_SIZE
+from hashing import hasher
+from mailer import mailer
+from metrics import current_loop_lag
+
+# стоимость в единицах корзины: вход — одна проверка bcrypt, регистрация —
+# хэш и письмо, смена пароля — проверка и хэш, выгрузка — проход по всей таблице
+COSTS = {"login": 5, "register": 10, "password": 10, "email": 10, "photo": 2, "stream": 10}
+
+
+class MemoryBuckets:
+    """Корзины в памяти процесса; при переполнении забываются давно не тронутые."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        """Списывает cost; возвращает 0 или сколько секунд ждать до успеха."""
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        self.buckets[key] = (tokens, now)
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+# то же, что MemoryBuckets.take, атомарно на стороне Redis
+TAKE_SCRIPT = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 't', 'u')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'u', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Общие корзины для нескольких воркеров. Нужен пакет redis."""
+
+    def __init__(self, url: str):
+        from redis import asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        return float(await self.script(keys=["rl:" + key], args=[rate, burst, cost]))
+
+
+class RateLimiter:
+    def __init__(self, store, enabled=True):
+        self.store = store
+        self.enabled = enabled
+        self.stats = {"allowed": 0, "limited": 0, "shed": 0}
+
+    async def _check(self, key: str, cost: float, per_minute: float, burst: float):
+        if not self.enabled:
+            return
+        # запрос дороже ёмкости корзины иначе не прошёл бы никогда
+        wait = await self.store.take(key, min(cost, burst), per_minute / 60, burst)
+        if wait > 0:
+            self.stats["limited"] += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Слишком много запросов, попробуйте позже",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+        self.stats["allowed"] += 1
+
+    async def check_ip(self, ip: str, cost: float):
+        await self._check("ip:" + ip, cost, RATE_LIMIT.ip_per_minute, RATE_LIMIT.ip_burst)
+
+    async def check_account(self, account, cost: float):
+        """account — id пользователя или email (для входа до проверки пароля)."""
+        key = "account:" + str(account).lower()
+        await self._check(key, cost, RATE_LIMIT.account_per_minute, RATE_LIMIT.account_burst)
+
+    def shed(self, sends_email: bool):
+        """503, если сервер не успевает; задержка loop известна при METRICS_ENABLED."""
+        if not self.enabled:
+            return
+        reason = None
+        if current_loop_lag[()] > RATE_LIMIT.shed_loop_lag_seconds:
+            reason = "loop"
+        elif hasher.pending >= hasher.queue_limit * RATE_LIMIT.shed_hasher_ratio:
+            reason = "bcrypt"
+        elif sends_email and mailer.queue is not None:
+            if mailer.queue.qsize() >= EMAIL_QUEUE_SIZE * RATE_LIMIT.shed_email_ratio:
+                reason = "email"
+        if reason:
+            self.stats["shed"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Сервер перегружен, попробуйте позже",
+                headers={"Retry-After": "5" if reason == "email" else "1"},
+            )
+
+
+def make_store():
+    if RATE_LIMIT.url:
+        return RedisBuckets(RATE_LIMIT.url)
+    return MemoryBuckets(RATE_LIMIT.max_keys)
+
+
+limiter = RateLimiter(make_store(), RATE_LIMIT.enabled)
+
+
+def client_ip(request: Request):
+    if RATE_LIMIT.trust_proxy:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def rate_limit(action: str, sends_email=False):
+    """Зависимость маршрута: сброс нагрузки и лимит по IP со стоимостью COSTS[action]."""
+    cost = COSTS[action]
+
+    async def dependency(request: Request):
+        limiter.shed(sends_email)
+        await limiter.check_ip(client_ip(request), cost)
+
+    return Depends(dependency)
@@ -0,0 +1,122 @@
+"""
+Регион объявления (код ISO 3166-2:RU), который один раз вычисляется при
+создании: по тексту адреса, а если в нём нет региона — по координатам через
+таблицу прямоугольников. Прямоугольники приблизительные: при пересечении
+выбирается наименьший, поэтому Москва побеждает Московскую область.
+
+    cd app && python regions.py backfill   # заполнить region у старых объявлений
+"""
+import asyncio
+import re
+import sys
+
+# код, название, варианты написания в адресе (в нижнем регистре),
+# (min_lat, max_lat, min_lon, max_lon)
+REGIONS = [
+    ("RU-MOW", "Москва", ("москва", "г. москва"), (55.14, 56.02, 36.80, 37.97)),
+    ("RU-MOS", "Московская область", ("московская обл", "подмосков"), (54.25, 56.96, 35.14, 40.21)),
+    ("RU-SPE", "Санкт-Петербург", ("санкт-петербург", "спб", "петербург"), (59.63, 60.25, 29.42, 30.76)),
+    ("RU-LEN", "Ленинградская область", ("ленинградская обл",), (58.42, 61.33, 27.70, 35.70)),
+    ("RU-KGD", "Калининградская область", ("калининград",), (54.30, 55.30, 19.60, 22.95)),
+    ("RU-NIZ", "Нижегородская область", ("нижегородская обл", "нижний новгород"), (54.45, 58.10, 41.80, 47.80)),
+    ("RU-TA", "Республика Татарстан", ("татарстан", "казань"), (53.97, 56.68, 47.25, 54.27)),
+    ("RU-SAM", "Самарская область", ("самарская обл", "самара", "тольятти"), (51.78, 54.68, 47.90, 52.60)),
+    ("RU-VOR", "Воронежская область", ("воронеж",), (49.60, 52.10, 38.10, 42.90)),
+    ("RU-ROS", "Ростовская область", ("ростовская обл", "ростов-на-дону"), (45.95, 50.25, 38.20, 44.35)),
+    ("RU-VGG", "Волгоградская область", ("волгоград",), (47.45, 51.30, 41.15, 47.50)),
+    ("RU-KDA", "Краснодарский край", ("краснодар", "сочи", "новороссийск"), (43.40, 46.90, 36.50, 41.80)),
+    ("RU-BA", "Республика Башкортостан", ("башкортостан", "уфа"), (51.55, 56.55, 53.15, 60.00)),
+    ("RU-PER", "Пермский край", ("пермский край", "пермь"), (56.10, 61.70, 51.80, 59.70)),
+    ("RU-SVE", "Свердловская область", ("свердловская обл", "екатеринбург"), (56.00, 61.95, 57.20, 66.20)),
+    ("RU-CHE", "Челябинская область", ("челябинская обл", "челябинск"), (51.95, 56.40, 57.10, 63.40)),
+    ("RU-OMS", "Омская область", ("омская обл", "омск"), (53.40, 58.60, 70.40, 76.30)),
+    ("RU-NVS", "Новосибирская область", ("новосибирск",), (53.30, 57.25, 75.10, 85.10)),
+    ("RU-KYA", "Красноярский край", ("красноярск",), (51.70, 81.30, 77.60, 113.90)),
+    ("RU-PRI", "Приморский край", ("приморский край", "владивосток"), (42.30, 48.50, 130.40, 139.10)),
+]
+
+REGION_CODES = {code for code, _, _, _ in REGIONS}
+
+# длинные варианты проверяются первыми; вариант должен начинать слово,
+# иначе «омск» нашёлся бы в «Томск»
+_ALIASES = [
+    (re.compile(r"(?<![а-яa-z])" + re.escape(alias)), code)
+    for alias, code in sorted(
+        ((alias, code) for code, name, aliases, _ in REGIONS for alias in aliases + (name.lower(),)),
+        key=lambda item: -len(item[0]),
+    )
+]
+
+
+def region_from_text(text: str):
+    text = (text or "").lower().replace("ё", "е")
+    for pattern, code in _ALIASES:
+        if pattern.search(text):
+            return code
+    return None
+
+
+def region_from_point(lat, lon):
+    best, best_area = None, None
+    for code, _, _, (min_lat, max_lat, min_lon, max_lon) in REGIONS:
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+            area = (max_lat - min_lat) * (max_lon - min_lon)
+            if best_area is None or area < best_area:
+                best, best_area = code, area
+    return best
+
+
+def derive_region(location: str, point):
+    region = region_from_text(location)
+    if region is None and point is not None:
+        region = region_from_point(*point)
+    return region
+
+
+def resolve_region(value: str):
+    """Фильтр region: код («RU-MOW») или название/вариант написания."""
+    if value.upper() in REGION_CODES:
+        return value.upper()
+    return region_from_text(value) or value
+
+
+async def backfill(batch_size: int = 1000):
+    from sqlalchemy import select, update
+    from database import engine, new_session
+    from models import Ad
+
+    last_id, updated = 0, 0
+    async with new_session() as session:
+        while True:
+            rows = (
+                await session.execute(
+                    select(Ad.id, Ad.location, Ad.lat, Ad.lon)
+                    .where(Ad.id > last_id, Ad.region.is_(None))
+                    .order_by(Ad.id)
+                    .limit(batch_size)
+                )
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            values = []
+            for row in rows:
+                point = (row.lat, row.lon) if row.lat is not None else None
+                region = derive_region(row.location, point)
+                if region:
+                    values.append({"id": row.id, "region": region})
+            if values:
+                await session.execute(update(Ad), values)
+                await session.commit()
+            updated += len(values)
+            print(f"id <= {last_id}: заполнено {updated}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        print("Использование: python regions.py backfill")
+        sys.exit(1)
+    asyncio.run(backfill())
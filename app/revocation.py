@@ -0,0 +1,209 @@
+"""
+Отзыв токенов без запроса в БД на каждый запрос.
+
+В памяти процесса два словаря: отозванные jti (выход из аккаунта) и
+минимальная версия токенов пользователя (смена пароля или email повышает
+users.token_version — все выданные раньше токены перестают действовать).
+Записи живут, пока могут жить сами токены.
+
+Каждый отзыв пишется в таблицу revocations и попадает в память только после
+commit. Воркеры раз в REVOCATION_SYNC_SECONDS дочитывают строки с id больше
+последнего и заново — строки последних REVOCATION_SYNC_OVERLAP_SECONDS: id
+из SERIAL выдаются до commit, и строка с меньшим id может стать видна позже
+строки с большим. Поэтому отзыв на одном воркере через несколько секунд
+действует на всех (транзакции дольше окна не допускаются).
+
+Больше REVOCATION_MAX_ENTRIES действующих записей в память не помещается:
+тогда вытесняются только истёкшие, а если их нет — список помечается
+переполненным и revoked() для токенов, которых нет в памяти, спрашивает БД,
+пока очистка и полная перезагрузка не уложатся в лимит.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+
+from sqlalchemy import select, delete, and_, or_, func
+
+from config import (
+    JWT,
+    REVOCATION_MAX_ENTRIES,
+    REVOCATION_SYNC_SECONDS,
+    REVOCATION_SYNC_OVERLAP_SECONDS,
+)
+from database import new_session
+from models import Revocation
+
+
+class RevocationList:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # jti -> время истечения (unix)
+        self.jtis: dict[str, float] = {}
+        # user_id -> (минимальная версия, время истечения)
+        self.versions: dict[int, tuple[int, float]] = {}
+        self.last_id = 0
+        # в памяти не всё: отрицательный ответ проверяется по БД
+        self.overflow = False
+        self.stats = {
+            "revoked_jti": 0,
+            "revoked_users": 0,
+            "evicted": 0,
+            "overflow": 0,
+            "lookups": 0,
+            "syncs": 0,
+        }
+        self._task: asyncio.Task | None = None
+
+    def is_revoked(self, payload: dict) -> bool:
+        """Только по памяти; при переполнении «нет» не окончательно (см. revoked)."""
+        jti = payload.get("jti")
+        if jti is not None and jti in self.jtis:
+            return True
+        entry = self.versions.get(int(payload.get("sub", 0)))
+        return entry is not None and payload.get("ver", 0) < entry[0]
+
+    async def revoked(self, payload: dict) -> bool:
+        if self.is_revoked(payload):
+            return True
+        if not self.overflow:
+            return False
+        return await self._lookup(payload)
+
+    async def _lookup(self, payload: dict) -> bool:
+        conditions = []
+        if payload.get("jti") is not None:
+            conditions.append(Revocation.jti == payload["jti"])
+        if payload.get("sub") is not None:
+            conditions.append(
+                and_(
+                    Revocation.user_id == int(payload["sub"]),
+                    Revocation.min_version > payload.get("ver", 0),
+                )
+            )
+        if not conditions:
+            return False
+        self.stats["lookups"] += 1
+        async with new_session() as session:
+            found = await session.scalar(
+                select(Revocation.id)
+                .where(or_(*conditions), Revocation.expires_at > func.now())
+                .limit(1)
+            )
+        return found is not None
+
+    def _remember(self, table: dict, key, value, expires_of=lambda value: value):
+        if key not in table and len(table) >= self.max_entries:
+            now = time.time()
+            expired = [k for k, v in table.items() if expires_of(v) <= now]
+            for k in expired:
+                del table[k]
+            self.stats["evicted"] += len(expired)
+            if len(table) >= self.max_entries:
+                # действующий отзыв нельзя забыть: он остаётся только в БД
+                self.overflow = True
+                self.stats["overflow"] += 1
+                return
+        table[key] = value
+
+    def _apply(self, row: Revocation):
+        expires = row.expires_at.timestamp()
+        if expires <= time.time():
+            return
+        if row.jti is not None:
+            self._remember(self.jtis, row.jti, expires)
+        else:
+            current = self.versions.get(row.user_id)
+            if current is None or current[0] < row.min_version:
+                self._remember(
+                    self.versions, row.user_id, (row.min_version, expires), itemgetter(1)
+                )
+
+    def remember(self, rows):
+        """Применяет строки revoke_token/revoke_user после успешного commit."""
+        for row in rows:
+            if row is not None:
+                self._apply(row)
+
+    def revoke_token(self, session, payload: dict):
+        """Строка отзыва одного токена по jti до его exp; commit и remember — за вызывающим."""
+        jti, exp = payload.get("jti"), payload.get("exp")
+        if jti is None or exp is None:
+            return None
+        row = Revocation(jti=jti, expires_at=datetime.fromtimestamp(exp, timezone.utc))
+        session.add(row)
+        self.stats["revoked_jti"] += 1
+        return row
+
+    def revoke_user(self, session, user_id: int, min_version: int):
+        """Строка отзыва всех токенов пользователя с ver < min_version; commit и remember — за вызывающим."""
+        expires = datetime.now(timezone.utc) + timedelta(days=JWT.refresh_token_expire_days)
+        row = Revocation(user_id=user_id, min_version=min_version, expires_at=expires)
+        session.add(row)
+        self.stats["revoked_users"] += 1
+        return row
+
+    async def _fetch(self, condition):
+        async with new_session() as session:
+            return (
+                await session.scalars(select(Revocation).where(condition).order_by(Revocation.id))
+            ).all()
+
+    async def sync(self):
+        overlap = func.now() - timedelta(seconds=REVOCATION_SYNC_OVERLAP_SECONDS)
+        rows = await self._fetch(
+            or_(Revocation.id > self.last_id, Revocation.created_at > overlap)
+        )
+        for row in rows:
+            self._apply(row)
+        if rows:
+            self.last_id = max(self.last_id, rows[-1].id)
+        self.stats["syncs"] += 1
+
+    async def reload(self):
+        """После переполнения: все действующие строки заново, без очистки памяти."""
+        overflows = self.stats["overflow"]
+        rows = await self._fetch(Revocation.expires_at > func.now())
+        for row in rows:
+            self._apply(row)
+        # переполнение во время загрузки (и параллельные отзывы) — память всё ещё неполна
+        if self.stats["overflow"] == overflows:
+            self.overflow = False
+
+    def purge(self):
+        now = time.time()
+        for jti in [jti for jti, expires in self.jtis.items() if expires <= now]:
+            del self.jtis[jti]
+        for user_id in [uid for uid, (_, expires) in self.versions.items() if expires <= now]:
+            del self.versions[user_id]
+
+    async def _run(self):
+        rounds = 0
+        while True:
+            await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+            try:
+                await self.sync()
+                rounds += 1
+                # раз в ~сотню синхронизаций чистим истёкшее в памяти и в таблице
+                if rounds % 100 == 0:
+                    self.purge()
+                    async with new_session() as session:
+                        now = datetime.now(timezone.utc)
+                        await session.execute(delete(Revocation).where(Revocation.expires_at < now))
+                        await session.commit()
+                    if self.overflow:
+                        await self.reload()
+            except Exception as e:
+                print("Ошибка синхронизации отозванных токенов:", e)
+
+    async def start(self):
+        await self.sync()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+revocations = RevocationList(REVOCATION_MAX_ENTRIES)
@@ -1,23 +1,94 @@
-from fastapi import APIRouter, Request
-from sqlalchemy import select
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, insert, tuple_, func
+from email.utils import format_datetime, parsedate_to_datetime
+import asyncio
+import hashlib
+import json
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timezone
+from typing import Optional, Literal, Annotated
+import csv
+import io
 
-from dependencies import sessionDep, userDep
-from models import Ad
-from schemas import AdOut, AdCreate, AdFilters
+from database import new_session
+from dependencies import sessionDep, principalDep
+from models import Ad, User
+from schemas import (
+    AdOut,
+    AdCard,
+    AdCreate,
+    AdExport,
+    AdFilters,
+    ad_list_adapter,
+    ad_card_list_adapter,
+    ad_export_list_adapter,
+)
+from geo import parse_point, radius_filter, haversine_km, DEFAULT_RADIUS_KM
+from pagination import decode_cursor, next_cursor
+from search import text_search
+from regions import derive_region, resolve_region
+from cache import listing_cache, facet_cache
+from config import LISTING_MAX_AGE, FEED_MAX_SUBSCRIBERS, FEED_QUEUE_SIZE, FEED_HEARTBEAT_SECONDS
+from feed import Broadcaster
+from matching import matcher
+from photos import thumbnails_column
+from ratelimit import rate_limit
 
 router = APIRouter(tags=["Ads"])
 
+STREAM_BATCH = 500
+FILTER_FIELDS = ("status", "type", "breed", "size", "danger", "region")
 
-@router.post("/ads/create")
-async def create_ad(data: AdCreate, session: sessionDep, current_user: userDep):
+
+def ad_columns(schema, entity=Ad):
+    """Только то, что отдаёт схема: строки вместо ORM-объектов."""
+    return [
+        thumbnails_column(entity) if name == "photos" else getattr(entity, name)
+        for name in schema.model_fields
+    ]
+
+
+AD_OUT_COLUMNS = ad_columns(AdOut)
+AD_CARD_COLUMNS = ad_columns(AdCard)
+# fields -> (колонки, схема, адаптер списка)
+FIELDSETS = {
+    "full": (AD_OUT_COLUMNS, AdOut, ad_list_adapter),
+    "card": (AD_CARD_COLUMNS, AdCard, ad_card_list_adapter),
+}
+# вся база одним запросом без входа: без контактов, чтобы их нельзя было собрать выгрузкой
+STREAM_FIELDSETS = {
+    **FIELDSETS,
+    "full": (ad_columns(AdExport), AdExport, ad_export_list_adapter),
+}
+
+
+def parse_time(value: str) -> datetime:
+    """ValueError, если время в неверном формате."""
     try:
-        time_obj = datetime.strptime(data.time, "%d.%m.%Y %H:%M")
+        return datetime.strptime(value, "%d.%m.%Y %H:%M")
     except ValueError:
-        return {"success": False, "message": "Неверный формат времени"}
+        # ISO 8601 — формат выгрузки /ads/stream
+        return datetime.fromisoformat(value)
+
+
+def place_values(location: str, geo_location: list):
+    """Место объявления и всё, что из него вычисляется."""
+    point = parse_point(geo_location)
+    return dict(
+        location=location,
+        geoLocation=geo_location,
+        lat=point[0] if point else None,
+        lon=point[1] if point else None,
+        region=derive_region(location, point),
+    )
+
 
-    ad = Ad(
-        user_id=current_user.id,
+def ad_values(data: AdCreate, user_id: int):
+    """Колонки нового объявления; ValueError, если время в неверном формате."""
+    return dict(
+        user_id=user_id,
+        state="active",
         status=data.status,
         type=data.type,
         breed=data.breed,
@@ -26,58 +97,437 @@ async def create_ad(data: AdCreate, session: sessionDep, current_user: userDep):
         distincts=data.distincts,
         nickname=data.nickname,
         danger=data.danger,
-        location=data.location,
-        geoLocation=data.geoLocation,
-        time=time_obj,
+        **place_values(data.location, data.geoLocation),
+        time=parse_time(data.time),
         contactName=data.contactName,
         contactPhone=data.contactPhone,
         contactEmail=data.contactEmail,
         extras=data.extras,
     )
 
-    session.add(ad)
-    await session.commit()
-    await session.refresh(ad)
+
+@router.post("/ads/create")
+async def create_ad(data: AdCreate, session: sessionDep, principal: principalDep):
+    try:
+        values = ad_values(data, principal.id)
+    except ValueError:
+        return {"success": False, "message": "Неверный формат времени"}
+
+    # один INSERT ... RETURNING вместо flush и refresh после commit
+    try:
+        row = (
+            await session.execute(
+                insert(Ad).values(**values).returning(Ad.id, Ad.created_at, Ad.updated_at)
+            )
+        ).one()
+        ad = Ad(**values, **row._mapping)
+        await feed.notify(session, [ad])
+        await session.commit()
+    except IntegrityError:
+        # токен пережил удаление аккаунта
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+
+    await listing_cache.invalidate(lambda params: ad_matches(params, ad, created=True))
+    feed.publish([ad])
+    matcher.enqueue([ad.id])
 
     return {"success": True, "ad_id": ad.id}
 
 
-@router.post("/ads")
-async def get_ads(session: sessionDep, filters: AdFilters):
+def filter_ads(query, filters: AdFilters):
+    """Условия фильтра и порядок выдачи: (query, ключ сортировки, по убыванию?)."""
+    # закрытые лежат в ads до переноса в архив (archive.py)
+    query = query.where(Ad.state == "active")
+    if filters.status:
+        query = query.where(Ad.status == filters.status)
+    if filters.type:
+        query = query.where(Ad.type == filters.type)
+    if filters.breed:
+        query = query.where(Ad.breed == filters.breed)
+    if filters.size:
+        query = query.where(Ad.size == filters.size)
+    if filters.danger:
+        query = query.where(Ad.danger == filters.danger)
+    if filters.region:
+        query = query.where(Ad.region == resolve_region(filters.region))
+
+    point = parse_point(filters.geoloc)
+    distance = None
+    if point:
+        radius = filters.radius or DEFAULT_RADIUS_KM
+        condition, distance = radius_filter(Ad.lat, Ad.lon, *point, radius)
+        query = query.where(condition)
+
+    # при поиске по тексту сортируем по релевантности, иначе по расстоянию или дате
+    if filters.query:
+        condition, rank = text_search(filters.query)
+        return query.where(condition), rank, True
+    if distance is not None:
+        return query, distance, False
+    return query, Ad.created_at, True
+
+
+def page_query(
+    query, sort_key, descending: bool, cursor: str | None, limit: int, id_column=Ad.id
+):
+    """Keyset-пагинация по (sort_key, id): выбирает limit + 1 строк (Ad, sort_key)."""
+    query = query.add_columns(sort_key.label("sort_key"))
+    if cursor:
+        key, last_id = decode_cursor(cursor)
+        if descending:
+            query = query.where(tuple_(sort_key, id_column) < tuple_(key, last_id))
+        else:
+            query = query.where(tuple_(sort_key, id_column) > tuple_(key, last_id))
+
+    if descending:
+        query = query.order_by(sort_key.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_key, id_column)
+    return query.limit(limit + 1)
+
+
+def listing_params(filters: AdFilters):
+    """Нормализованные фильтры: ключ кэша списка объявлений."""
+    params = {key: value for key, value in filters.model_dump().items() if value}
+    if "region" in params:
+        params["region"] = resolve_region(params["region"])
+    point = parse_point(filters.geoloc)
+    if point:
+        params["geoloc"] = list(point)
+        params["radius"] = filters.radius or DEFAULT_RADIUS_KM
+    else:
+        params.pop("geoloc", None)
+        params.pop("radius", None)
+    return params
+
+
+def ad_matches(params: dict, ad: Ad, created=False):
+    """Может ли объявление попасть в выдачу с такими параметрами (см. filter_ads)."""
+    for field in FILTER_FIELDS:
+        if field in params and params[field] != getattr(ad, field):
+            return False
+
+    if "geoloc" in params:
+        if ad.lat is None:
+            return False
+        if haversine_km(*params["geoloc"], ad.lat, ad.lon) > params["radius"]:
+            return False
+        return True
+
+    # совпадение по тексту и место в выдаче по релевантности считает только БД
+    if "query" in params:
+        return True
+
+    # новое объявление — самое свежее, на страницы после курсора оно не попадает
+    if created and "cursor" in params:
+        return False
+    return True
+
+
+feed = Broadcaster(ad_matches)
+
+
+def ads_query(filters: AdFilters, columns=None):
+    columns = columns or FIELDSETS[filters.fields][0]
+    query, sort_key, descending = filter_ads(select(*columns), filters)
+    return page_query(query, sort_key, descending, filters.cursor, filters.limit)
+
+
+# версия страницы: тот же запрос, но без текстов, фото и сериализации
+VERSION_COLUMNS = [Ad.id, Ad.updated_at]
+
+
+def page_etag(scope: str, rows, limit: int) -> str:
+    """
+    ETag страницы по id и updated_at её объявлений: правка, смена state и фото
+    меняют updated_at, удаление и перенос в архив — состав страницы.
+    """
+    items = ",".join(f"{row.id}:{row.updated_at.isoformat()}" for row in rows[:limit])
+    return make_etag(f"{scope}|{items}|{len(rows) > limit}".encode())
+
+
+def render_page(rows, limit: int, fields: str = "full", adapter=None) -> bytes:
+    """Готовый JSON страницы: строки валидируются и сериализуются одним вызовом."""
+    adapter = adapter or FIELDSETS[fields][2]
+    ads = adapter.dump_json(adapter.validate_python(rows[:limit], from_attributes=True))
+    cursor = json.dumps(next_cursor(rows, limit)).encode()
+    return b'{"success":true,"ads":' + ads + b',"next_cursor":' + cursor + b"}"
+
+
+def make_etag(data: bytes) -> str:
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # для GET/HEAD сравнение слабое: W/"x" совпадает с "x"
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def not_modified_since(request: Request, last_modified: datetime | None) -> bool:
+    # If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2)
+    header = request.headers.get("if-modified-since")
+    if last_modified is None or not header or "if-none-match" in request.headers:
+        return False
     try:
-        query = select(Ad)
-
-        if filters.status:
-            query = query.where(Ad.status == filters.status)
-        if filters.type:
-            query = query.where(Ad.type == filters.type)
-        if filters.breed:
-            query = query.where(Ad.breed == filters.breed)
-        if filters.size:
-            query = query.where(Ad.size == filters.size)
-        if filters.danger:
-            query = query.where(Ad.danger == filters.danger)
-        if filters.region:
-            ...  # HERE
-        if filters.geoloc:
-            ...  # AND HERE
-
-        query = query.order_by(Ad.created_at.desc()).limit(50)
-        result = await session.scalars(query)
-        ads = result.all()
-        ads_out = [AdOut.model_validate(ad) for ad in ads]
-        return {"success": True, "ads": ads_out}
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # в заголовке секунды: доли отбрасываются
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional_response(request: Request, body, etag: str, headers: dict, last_modified=None):
+    """304 без тела, если у клиента та же версия, иначе JSON body."""
+    headers = {"ETag": etag, **headers}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    if etag_matches(request, etag) or not_modified_since(request, last_modified):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def listing_response(request: Request, session, filters: AdFilters, cache_control: str):
+    headers = {"Cache-Control": cache_control}
+    # в кэше ETag и тело вместе: ETag считается по тем же строкам, что и тело
+    async def load():
+        columns = [*FIELDSETS[filters.fields][0], Ad.updated_at]
+        rows = (await session.execute(ads_query(filters, columns))).all()
+        etag = page_etag(key, rows, filters.limit)
+        return etag.encode() + b"\n" + render_page(rows, filters.limit, filters.fields)
+
+    try:
+        key = listing_cache.key(listing_params(filters))
+        entry = await listing_cache.get(key)
+        if entry is None and "if-none-match" in request.headers:
+            # промах кэша: 304 по версии страницы, тело не выбирается
+            rows = (await session.execute(ads_query(filters, VERSION_COLUMNS))).all()
+            etag = page_etag(key, rows, filters.limit)
+            if etag_matches(request, etag):
+                return conditional_response(request, None, etag, headers)
+        if entry is None:
+            entry = await listing_cache.load(key, load)
+    except HTTPException:
+        raise
     except Exception as e:
         print("Ошибка в /ads:", e)
         return {"success": False, "message": "Ошибка на сервере"}
 
+    etag, _, body = entry.partition(b"\n")
+    return conditional_response(request, body, etag.decode(), headers)
+
+
+@router.post("/ads")
+async def get_ads(request: Request, session: sessionDep, filters: AdFilters):
+    # POST общие кэши не сохраняют: только ETag и 304
+    return await listing_response(request, session, filters, "no-cache")
+
+
+@router.get("/ads")
+async def get_ads_cacheable(
+    request: Request, session: sessionDep, filters: Annotated[AdFilters, Query()]
+):
+    """То же, что POST /ads, но фильтры в строке запроса: ответ кэшируют CDN и браузер."""
+    # выдача одинакова для всех пользователей, в том числе страницы по cursor
+    return await listing_response(request, session, filters, f"public, max-age={LISTING_MAX_AGE}")
+
+
+FACET_FIELDS = ("status", "type", "breed", "size", "danger")
+
+
+def facets_query(filters: AdFilters):
+    """Счётчики по каждому полю FACET_FIELDS и общий итог одним GROUPING SETS."""
+    columns = [getattr(Ad, name) for name in FACET_FIELDS]
+    query = select(*columns, func.count().label("count"))
+    query, _, _ = filter_ads(query, filters)
+    return query.group_by(func.grouping_sets(*(tuple_(column) for column in columns), tuple_()))
+
+
+def render_facets(rows) -> bytes:
+    facets = {name: {} for name in FACET_FIELDS}
+    total = 0
+    for row in rows:
+        # колонки NOT NULL: NULL означает, что строка — итог другого набора
+        for name in FACET_FIELDS:
+            value = getattr(row, name)
+            if value is not None:
+                facets[name][value] = row.count
+                break
+        else:
+            total = row.count
+    return json.dumps({"success": True, "total": total, "facets": facets}).encode()
+
+
+async def facets_response(session, filters: AdFilters):
+    async def load():
+        result = await session.execute(facets_query(filters))
+        return render_facets(result.all())
+
+    params = listing_params(filters)
+    for name in ("cursor", "limit", "fields"):
+        params.pop(name, None)
+    body = await facet_cache.get_or_load(facet_cache.key(params), load)
+    return Response(content=body, media_type="application/json")
+
+
+@router.post("/ads/facets")
+async def get_facets(session: sessionDep, filters: AdFilters):
+    return await facets_response(session, filters)
+
+
+@router.get("/ads/facets")
+async def get_facets_cacheable(session: sessionDep, filters: Annotated[AdFilters, Query()]):
+    return await facets_response(session, filters)
+
+
+def csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+@router.post("/ads/stream", dependencies=[rate_limit("stream")])
+async def stream_ads(filters: AdFilters, format: Literal["ndjson", "csv"] = "ndjson"):
+    columns, schema, adapter = STREAM_FIELDSETS[filters.fields]
+    query, sort_key, descending = filter_ads(select(*columns), filters)
+    if descending:
+        query = query.order_by(sort_key.desc(), Ad.id.desc())
+    else:
+        query = query.order_by(sort_key, Ad.id)
+
+    def to_ndjson(ads):
+        return "".join(ad.model_dump_json() + "\n" for ad in ads)
+
+    def to_csv(ads):
+        # колонки POST /ads/import, кроме контактов
+        lines = []
+        for ad in ads:
+            row = ad.model_dump(mode="json")
+            row["geoLocation"] = ";".join(str(value) for value in ad.geoLocation)
+            row["photos"] = ";".join(ad.photos)
+            lines.append(csv_line(row.values()))
+        return "".join(lines)
+
+    async def lines():
+        if format == "csv":
+            yield csv_line(schema.model_fields)
+        # своя сессия: поток живёт дольше обработчика; asyncpg отдаёт строки
+        # с серверного курсора пачками по STREAM_BATCH
+        async with new_session() as session:
+            result = await session.stream(query.execution_options(yield_per=STREAM_BATCH))
+            async for rows in result.partitions():
+                ads = adapter.validate_python(rows, from_attributes=True)
+                yield to_csv(ads) if format == "csv" else to_ndjson(ads)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(lines(), media_type=media_type)
+
+
+def sse_event(ad_id: int, payload: str):
+    return f"id: {ad_id}\nevent: ad\ndata: {payload}\n\n"
+
+
+@router.get("/ads/feed")
+async def ads_feed(request: Request, filters: Annotated[AdFilters, Query()]):
+    """SSE: новые объявления под фильтр; после переподключения догоняет с Last-Event-ID."""
+    if filters.query:
+        raise HTTPException(status_code=400, detail="Поиск по тексту в ленте не поддерживается")
+    if feed.count >= FEED_MAX_SUBSCRIBERS:
+        raise HTTPException(
+            status_code=503, detail="Слишком много подписчиков", headers={"Retry-After": "30"}
+        )
+    params = listing_params(filters)
+    columns, schema, adapter = FIELDSETS[filters.fields]
+    last_event_id = request.headers.get("last-event-id", "")
+
+    async def events():
+        # подписка до догоняющего запроса, чтобы не потерять объявления между ними
+        subscription = feed.subscribe(params, filters.fields)
+        if subscription is None:
+            return
+        try:
+            last_id = 0
+            if last_event_id.isdigit():
+                query, _, _ = filter_ads(select(*columns), filters)
+                query = query.where(Ad.id > int(last_event_id)).order_by(Ad.id).limit(FEED_QUEUE_SIZE)
+                async with new_session() as session:
+                    rows = (await session.execute(query)).all()
+                for ad in adapter.validate_python(rows, from_attributes=True):
+                    last_id = ad.id
+                    yield sse_event(ad.id, ad.model_dump_json())
+
+            while True:
+                try:
+                    ad_id, payload = await asyncio.wait_for(
+                        subscription.queue.get(), FEED_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                if ad_id > last_id:
+                    yield sse_event(ad_id, payload)
+        finally:
+            feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.get("/ads/my")
-async def get_my_ads(request: Request, session: sessionDep, current_user: userDep):
-    query = (
-        select(Ad).where(Ad.user_id == current_user.id).order_by(Ad.created_at.desc())
+async def get_my_ads(
+    request: Request,
+    session: sessionDep,
+    principal: principalDep,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    fields: Literal["full", "card"] = "full",
+):
+    # удалённые и перенесённые в архив объявления из страницы пропадают, не
+    # меняя updated_at оставшихся: время удаления хранится в users
+    removed_at = (
+        select(User.ads_removed_at).where(User.id == principal.id).scalar_subquery().label("removed_at")
     )
-    result = await session.scalars(query)
-    ads = result.all()
-    ads_out = [AdOut.model_validate(ad) for ad in ads]
-    return {"success": True, "ads": ads_out}
+
+    def my_query(columns):
+        query = select(*columns, Ad.updated_at, removed_at).where(Ad.user_id == principal.id)
+        return page_query(query, Ad.created_at, True, cursor, limit)
+
+    def versions(rows):
+        etag = page_etag(f"my:{principal.id}:{cursor}:{limit}:{fields}", rows, limit)
+        # пустая страница без Last-Modified: по дате её не сравнить
+        if not rows:
+            return etag, None
+        times = [row.updated_at for row in rows[:limit]] + [rows[0].removed_at]
+        return etag, max(time for time in times if time is not None)
+
+    headers = {"Cache-Control": "private, no-cache"}
+    # версия — по индексу ix_ads_user_id_created_at; совпала — страница не выбирается
+    if "if-none-match" in request.headers or "if-modified-since" in request.headers:
+        etag, last_modified = versions((await session.execute(my_query([Ad.id]))).all())
+        if etag_matches(request, etag) or not_modified_since(request, last_modified):
+            return conditional_response(request, None, etag, headers, last_modified)
+
+    rows = (await session.execute(my_query(FIELDSETS[fields][0]))).all()
+    etag, last_modified = versions(rows)
+    return conditional_response(request, render_page(rows, limit, fields), etag, headers, last_modified)
+
+
+@router.get("/ads/{ad_id:int}")
+async def get_ad(ad_id: int, session: sessionDep):
+    """Одно объявление, в том числе закрытое; на него ведут ссылки из писем о совпадениях."""
+    # :int — чтобы /ads/matches и другие пути из одного сегмента не попадали сюда
+    row = (await session.execute(select(*AD_OUT_COLUMNS).where(Ad.id == ad_id))).one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    return {"success": True, "ad": AdOut.model_validate(row)}
@@ -0,0 +1,50 @@
+"""
+Объявления из ads_archive (см. archive.py).
+
+GET /ads/archive/{ad_id} — для всех, без описания и контактов
+GET /ads/my/archive      — архив владельца целиком, новые первыми
+"""
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response
+from sqlalchemy import select
+
+from dependencies import sessionDep, principalDep
+from models import ArchivedAd
+from routes.ad import ad_columns, page_query, render_page
+from schemas import ArchivedAdCard, ArchivedAdOut, archived_ad_list_adapter
+
+router = APIRouter(tags=["Ads"])
+
+ARCHIVED_CARD_COLUMNS = ad_columns(ArchivedAdCard, ArchivedAd)
+ARCHIVED_OUT_COLUMNS = ad_columns(ArchivedAdOut, ArchivedAd)
+
+
+@router.get("/ads/archive/{ad_id}")
+async def get_archived_ad(ad_id: int, session: sessionDep):
+    row = (
+        await session.execute(select(*ARCHIVED_CARD_COLUMNS).where(ArchivedAd.id == ad_id))
+    ).one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    return {"success": True, "ad": ArchivedAdCard.model_validate(row)}
+
+
+@router.get("/ads/my/archive")
+async def get_my_archived_ads(
+    session: sessionDep,
+    principal: principalDep,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+):
+    query = page_query(
+        select(*ARCHIVED_OUT_COLUMNS).where(ArchivedAd.user_id == principal.id),
+        ArchivedAd.archived_at,
+        True,
+        cursor,
+        limit,
+        id_column=ArchivedAd.id,
+    )
+    rows = (await session.execute(query)).all()
+    body = render_page(rows, limit, adapter=archived_ad_list_adapter)
+    return Response(content=body, media_type="application/json")
@@ -0,0 +1,203 @@
+"""
+Массовая загрузка объявлений (приюты, сайты-партнёры).
+
+POST /ads/bulk   — JSON-массив AdCreate, до BULK_MAX_ITEMS штук;
+POST /ads/import — поток NDJSON (application/x-ndjson) или CSV (text/csv)
+                   с заголовком из полей AdCreate; geoLocation в CSV — «lat;lon».
+
+Строки вставляются пачками по BULK_BATCH_SIZE одним многострочным
+INSERT ... RETURNING id; ошибки валидации возвращаются по номерам строк.
+"""
+import codecs
+import csv
+import json
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from config import BULK_MAX_ITEMS, BULK_BATCH_SIZE, IMPORT_MAX_ERRORS
+from dependencies import sessionDep, principalDep
+from models import Ad
+from schemas import AdCreate
+from cache import listing_cache
+from matching import matcher
+from routes.ad import ad_values, ad_matches, feed
+
+router = APIRouter(tags=["Ads"])
+
+
+class Import:
+    """Счётчики одной загрузки и вставка накопленной пачки."""
+
+    def __init__(self, session, user_id: int):
+        self.session = session
+        self.user_id = user_id
+        self.batch = []  # [(номер строки, значения колонок)]
+        self.ids = []
+        self.errors = []
+        self.failed = 0
+
+    def error(self, row: int, message):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "errors": message})
+
+    async def add(self, row: int, data: AdCreate):
+        try:
+            self.batch.append((row, ad_values(data, self.user_id)))
+        except ValueError:
+            self.error(row, "Неверный формат времени")
+            return
+        if len(self.batch) >= BULK_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        values = [item for _, item in batch]
+        try:
+            result = await self.session.execute(
+                insert(Ad).returning(Ad.id, sort_by_parameter_order=True), values
+            )
+            ids = result.scalars().all()
+            ads = [Ad(**item, id=ad_id) for item, ad_id in zip(values, ids)]
+            await feed.notify(self.session, ads)
+            await self.session.commit()
+        except IntegrityError:
+            await self.session.rollback()
+            # токен пережил удаление аккаунта; пачки, записанные раньше,
+            # удалены вместе с пользователем каскадом
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
+        except DBAPIError as e:
+            await self.session.rollback()
+            print("Ошибка вставки пачки объявлений:", e)
+            for row, _ in batch:
+                self.error(row, "Ошибка при сохранении")
+            return
+
+        self.ids += ids
+        await listing_cache.invalidate(
+            lambda params: any(ad_matches(params, ad, created=True) for ad in ads)
+        )
+        feed.publish(ads)
+        matcher.enqueue(ids)
+
+    def result(self):
+        return {
+            "success": self.failed == 0,
+            "inserted": len(self.ids),
+            "failed": self.failed,
+            "ad_ids": self.ids,
+            "errors": self.errors,
+        }
+
+
+def validation_errors(e: ValidationError):
+    return [
+        {"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]}
+        for error in e.errors(include_url=False, include_context=False, include_input=False)
+    ]
+
+
+@router.post("/ads/bulk")
+async def bulk_create_ads(items: list[dict], session: sessionDep, principal: principalDep):
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"Не больше {BULK_MAX_ITEMS} объявлений за запрос"
+        )
+
+    job = Import(session, principal.id)
+    for row, item in enumerate(items):
+        try:
+            data = AdCreate.model_validate(item)
+        except ValidationError as e:
+            job.error(row, validation_errors(e))
+            continue
+        await job.add(row, data)
+    await job.flush()
+    return job.result()
+
+
+async def body_lines(request: Request):
+    """Строки тела запроса по мере получения, без чтения всего тела в память."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in request.stream():
+        lines = (tail + decoder.decode(chunk)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def csv_records(lines):
+    """Записи CSV как словари; значение в кавычках может занимать несколько строк."""
+    header = None
+    pending = ""
+    async for line in lines:
+        pending = pending + "\n" + line if pending else line
+        # нечётное число кавычек — поле в кавычках ещё не закрыто
+        if pending.count('"') % 2:
+            continue
+        record = next(csv.reader([pending])) if pending else []
+        pending = ""
+        if header is None:
+            header = record
+            continue
+        if not record:
+            yield None
+            continue
+        item = dict(zip(header, record))
+        point = item.get("geoLocation", "")
+        item["geoLocation"] = [part for part in point.split(";") if part.strip()]
+        yield item
+    if pending:
+        # предыдущие пачки уже записаны: ошибка строки, а не отказ всего запроса
+        yield "Незакрытые кавычки в CSV"
+
+
+async def ndjson_records(lines):
+    """Объекты NDJSON; вместо неразборчивой строки — текст ошибки."""
+    async for line in lines:
+        if not line.strip():
+            yield None
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield "Неверный JSON"
+
+
+@router.post("/ads/import")
+async def import_ads(request: Request, session: sessionDep, principal: principalDep):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type not in ("application/x-ndjson", "text/csv"):
+        raise HTTPException(
+            status_code=415, detail="Ожидается application/x-ndjson или text/csv"
+        )
+
+    job = Import(session, principal.id)
+    lines = body_lines(request)
+    records = csv_records(lines) if content_type == "text/csv" else ndjson_records(lines)
+
+    row = -1
+    async for item in records:
+        row += 1
+        if item is None:  # пустая строка
+            continue
+        if isinstance(item, str):
+            job.error(row, item)
+            continue
+        try:
+            data = AdCreate.model_validate(item)
+        except ValidationError as e:
+            job.error(row, validation_errors(e))
+            continue
+        await job.add(row, data)
+    await job.flush()
+    return job.result()
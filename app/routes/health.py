@@ -0,0 +1,41 @@
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+import startup
+from config import READY_DB_TIMEOUT
+from database import engine, pool_status
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+
+@router.get("/live")
+async def live():
+    """Процесс жив и event loop отвечает; БД не проверяется."""
+    return {"status": "ok"}
+
+
+async def ping_db():
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+@router.get("/ready")
+async def ready():
+    """200, когда воркер прогрет и БД доступна, иначе 503."""
+    if not startup.state["ready"]:
+        return JSONResponse({"status": "starting", "timings": startup.timings}, status_code=503)
+    try:
+        # ожидание соединения из пула тоже входит в таймаут
+        await asyncio.wait_for(ping_db(), READY_DB_TIMEOUT)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        return JSONResponse({"status": "db_unavailable", "error": error}, status_code=503)
+    return {"status": "ready", "timings": startup.timings}
+
+
+@router.get("/pool")
+async def get_pool_status():
+    return pool_status()
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Query
+from sqlalchemy import select, union_all, and_, or_
+from typing import List, Optional
+
+from dependencies import sessionDep, principalDep
+from models import Ad, AdMatch, ArchivedAd
+from schemas import AdOut, AdMatchOut
+from photos import thumbnails_column
+from pydantic import TypeAdapter
+
+router = APIRouter(tags=["Ads"])
+
+match_list_adapter = TypeAdapter(List[AdMatchOut])
+
+MATCH_FIELDS = [name for name in AdOut.model_fields if name != "photos"]
+
+
+def any_ad(name: str, fields):
+    """ads и ads_archive вместе: пара видна и после переноса объявления в архив."""
+    return union_all(
+        select(*(getattr(Ad, field) for field in fields)),
+        select(*(getattr(ArchivedAd, field) for field in fields)),
+    ).subquery(name)
+
+
+@router.get("/ads/matches")
+async def get_matches(
+    session: sessionDep,
+    principal: principalDep,
+    ad_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=100),
+):
+    """Совпадения для объявлений текущего пользователя, лучшие первыми."""
+    own = any_ad("own", ["id", "user_id"])
+    other = any_ad("other", MATCH_FIELDS)
+    query = (
+        select(
+            own.c.id.label("own_id"),
+            AdMatch.score,
+            AdMatch.distance_km,
+            *(other.c[name] for name in MATCH_FIELDS),
+            thumbnails_column(other),
+        )
+        .join(own, or_(own.c.id == AdMatch.lost_ad_id, own.c.id == AdMatch.found_ad_id))
+        .join(
+            other,
+            and_(
+                other.c.id != own.c.id,
+                or_(other.c.id == AdMatch.lost_ad_id, other.c.id == AdMatch.found_ad_id),
+            ),
+        )
+        .where(own.c.user_id == principal.id)
+        .order_by(AdMatch.score.desc(), AdMatch.id.desc())
+        .limit(limit)
+    )
+    if ad_id is not None:
+        query = query.where(own.c.id == ad_id)
+
+    rows = (await session.execute(query)).all()
+    matches = match_list_adapter.validate_python(
+        [
+            {
+                "ad_id": row.own_id,
+                "score": row.score,
+                "distance_km": row.distance_km,
+                "match": {name: getattr(row, name) for name in AdOut.model_fields},
+            }
+            for row in rows
+        ]
+    )
+    return {"success": True, "matches": matches}
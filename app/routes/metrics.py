@@ -0,0 +1,129 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from archive import archiver
+from cache import listing_cache, facet_cache
+from database import pool_status
+from hashing import hasher
+from mailer import mailer
+from metrics import render, render_gauges
+from matching import matcher
+from ratelimit import limiter
+from revocation import revocations
+from routes.ad import feed
+from routes.photos import thumbnailer
+import startup
+
+router = APIRouter(tags=["Metrics"])
+
+
+def component_lines():
+    lines = render_gauges(
+        "worker_startup_seconds",
+        "Время от начала импорта до этапа запуска воркера",
+        {(("phase", phase),): seconds for phase, seconds in startup.timings.items()},
+    )
+    pool = pool_status()
+    lines += render_gauges(
+        "db_pool_connections",
+        "Соединения пула",
+        {(("state", "in_use"),): pool.get("in_use", 0), (("state", "size"),): pool.get("size", 0)},
+    )
+    lines += render_gauges(
+        "db_pool_checkout_wait_seconds_total",
+        "Суммарное ожидание соединения из пула",
+        {(): pool["wait_seconds"]},
+        "counter",
+    )
+    lines += render_gauges(
+        "db_pool_checkouts_total", "Выдачи соединений из пула", {(): pool["checkouts"]}, "counter"
+    )
+
+    lines += render_gauges("password_hash_pending", "bcrypt в очереди и в работе", {(): hasher.pending})
+    lines += render_gauges(
+        "password_hash_seconds_total",
+        "Время bcrypt: ожидание в очереди и хеширование",
+        {
+            (("phase", "queued"),): hasher.stats["queued_seconds"],
+            (("phase", "hashing"),): hasher.stats["hashing_seconds"],
+        },
+        "counter",
+    )
+    lines += render_gauges(
+        "password_hash_rejected_total", "Отказы из-за переполнения", {(): hasher.stats["rejected"]}, "counter"
+    )
+
+    queued = mailer.queue.qsize() if mailer.queue is not None else 0
+    lines += render_gauges("email_queue_size", "Письма в очереди", {(): queued})
+    lines += render_gauges(
+        "email_total",
+        "Письма по результату",
+        {(("result", name),): value for name, value in mailer.stats.items()},
+        "counter",
+    )
+
+    events = {}
+    for cache_name, cache in (("listing", listing_cache), ("facets", facet_cache)):
+        cache_stats = {**cache.stats, "evictions": cache.evictions}
+        for name, value in cache_stats.items():
+            events[(("cache", cache_name), ("event", name))] = value
+    lines += render_gauges(
+        "ads_cache_events_total", "События кэшей объявлений", events, "counter"
+    )
+
+    lines += render_gauges(
+        "rate_limit_decisions_total",
+        "Решения ограничителя частоты",
+        {(("decision", name),): value for name, value in limiter.stats.items()},
+        "counter",
+    )
+
+    lines += render_gauges("ads_feed_subscribers", "Подписчики ленты объявлений", {(): feed.count})
+    lines += render_gauges(
+        "ads_feed_events_total",
+        "События ленты объявлений",
+        {(("event", name),): value for name, value in feed.stats.items()},
+        "counter",
+    )
+
+    queued = matcher.queue.qsize() if matcher.queue is not None else 0
+    lines += render_gauges("ad_match_queue_size", "Объявления в очереди поиска пары", {(): queued})
+    lines += render_gauges(
+        "ad_match_events_total",
+        "Поиск пар объявлений",
+        {(("event", name),): value for name, value in matcher.stats.items()},
+        "counter",
+    )
+
+    lines += render_gauges(
+        "token_revocations_entries",
+        "Отозванные токены в памяти",
+        {(("kind", "jti"),): len(revocations.jtis), (("kind", "user"),): len(revocations.versions)},
+    )
+    lines += render_gauges(
+        "token_revocations_events_total",
+        "События списка отозванных токенов",
+        {(("event", name),): value for name, value in revocations.stats.items()},
+        "counter",
+    )
+
+    queued = thumbnailer.queue.qsize() if thumbnailer.queue is not None else 0
+    lines += render_gauges("photo_queue_size", "Фото в очереди на превью", {(): queued})
+    lines += render_gauges(
+        "photo_events_total",
+        "Обработка фото",
+        {(("event", name),): value for name, value in thumbnailer.stats.items()},
+        "counter",
+    )
+    lines += render_gauges(
+        "ads_archive_events_total",
+        "Перенос объявлений в архив",
+        {(("event", name),): value for name, value in archiver.stats.items()},
+        "counter",
+    )
+    return lines
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render(component_lines()), media_type="text/plain; version=0.0.4")
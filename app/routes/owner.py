@@ -0,0 +1,172 @@
+"""
+Правка, закрытие и удаление объявлений владельцем.
+
+PATCH  /ads/{ad_id}        — изменить переданные поля
+PUT    /ads/{ad_id}/state  — закрыть (resolved, closed) или открыть снова
+POST   /ads/state          — то же для списка ids
+DELETE /ads/{ad_id}        — удалить вместе с фото и совпадениями
+POST   /ads/delete         — то же для списка ids
+
+Каждая операция — один запрос UPDATE/DELETE ... WHERE user_id = :me AND
+id = ANY(:ids) RETURNING: чужие и уже перенесённые в архив объявления не
+находятся и возвращаются в missing (для одного id — 404). Число запросов
+проверяет tests/test_query_count.py (нужен Postgres).
+"""
+from fastapi import APIRouter, HTTPException
+from sqlalchemy import select, update, delete, and_, or_, any_, literal, func, ARRAY, Integer
+
+from cache import listing_cache
+from config import BULK_MAX_ITEMS
+from dependencies import sessionDep, principalDep
+from matching import matcher
+from models import Ad, AdMatch, AdPhoto, User
+from schemas import AdOut, AdUpdate, AdIds, AdStateUpdate, AdStateBulkUpdate
+from routes.ad import FILTER_FIELDS, ad_matches, parse_time, place_values
+
+router = APIRouter(tags=["Ads"])
+
+# всё, что нужно ad_matches, чтобы сбросить страницы кэша с этими объявлениями
+AFFECTED_COLUMNS = [Ad.id, *(getattr(Ad, name) for name in FILTER_FIELDS), Ad.lat, Ad.lon]
+# поля, от которых зависит попадание в выдачу по фильтрам
+FILTER_KEYS = {*FILTER_FIELDS, "location", "geoLocation"}
+# ORM не сверяет identity map: в сессии обработчика объявлений нет
+NO_SYNC = {"synchronize_session": False}
+
+
+def owned(user_id: int, ids: list[int]):
+    # один параметр-массив: один подготовленный запрос на любое число ids
+    return and_(Ad.user_id == user_id, Ad.id == any_(literal(ids, ARRAY(Integer))))
+
+
+def check_size(ids: list[int]):
+    if len(ids) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Не больше {BULK_MAX_ITEMS} объявлений")
+
+
+def ad_changes(data: AdUpdate):
+    """Колонки для UPDATE; ValueError, если время в неверном формате."""
+    # null для обязательного поля означает «не менять»
+    changes = {
+        key: value for key, value in data.model_dump(exclude_unset=True).items() if value is not None
+    }
+    if "time" in changes:
+        changes["time"] = parse_time(changes["time"])
+    if "location" in changes or "geoLocation" in changes:
+        changes.update(place_values(data.location or "", data.geoLocation or []))
+    return changes
+
+
+async def invalidate(rows):
+    await listing_cache.invalidate(lambda params: any(ad_matches(params, row) for row in rows))
+
+
+def bulk_result(ids: list[int], rows, key: str):
+    done = {row.id for row in rows}
+    return {"success": True, key: sorted(done), "missing": [i for i in ids if i not in done]}
+
+
+@router.patch("/ads/{ad_id}")
+async def edit_ad(ad_id: int, data: AdUpdate, session: sessionDep, principal: principalDep):
+    try:
+        changes = ad_changes(data)
+    except ValueError:
+        return {"success": False, "message": "Неверный формат времени"}
+
+    ad = await session.scalar(
+        update(Ad)
+        .where(owned(principal.id, [ad_id]))
+        .values(**changes, updated_at=func.now())
+        .returning(Ad)
+        .execution_options(**NO_SYNC)
+    )
+    # commit только после проверки: неудачный запрос ничего не записывает
+    if ad is None:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    await session.commit()
+
+    if FILTER_KEYS & changes.keys():
+        # прежние значения фильтров неизвестны: страницы, где объявление было, не найти
+        await listing_cache.invalidate(lambda params: True)
+    else:
+        await invalidate([ad])
+    matcher.enqueue([ad.id])
+    return {"success": True, "ad": AdOut.model_validate(ad).model_dump(exclude={"photos"})}
+
+
+async def set_state(session, user_id: int, ids: list[int], state: str):
+    closed_at = None if state == "active" else func.now()
+    rows = (
+        await session.execute(
+            update(Ad)
+            .where(owned(user_id, ids))
+            .values(state=state, closed_at=closed_at, updated_at=func.now())
+            .returning(*AFFECTED_COLUMNS)
+            .execution_options(**NO_SYNC)
+        )
+    ).all()
+    return rows
+
+
+async def finish(session, rows):
+    """commit и сброс кэша; для одного объявления вызывается, только если оно нашлось."""
+    await session.commit()
+    if rows:
+        await invalidate(rows)
+
+
+@router.put("/ads/{ad_id}/state")
+async def set_ad_state(ad_id: int, data: AdStateUpdate, session: sessionDep, principal: principalDep):
+    """Закрыть объявление (resolved, closed) или открыть снова, пока оно не в архиве."""
+    rows = await set_state(session, principal.id, [ad_id], data.state)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    await finish(session, rows)
+    return {"success": True, "state": data.state}
+
+
+@router.post("/ads/state")
+async def set_ads_state(data: AdStateBulkUpdate, session: sessionDep, principal: principalDep):
+    check_size(data.ids)
+    rows = await set_state(session, principal.id, data.ids, data.state)
+    await finish(session, rows)
+    return bulk_result(data.ids, rows, "updated")
+
+
+async def delete_ads(session, user_id: int, ids: list[int]):
+    # у ad_photos и ad_matches нет внешних ключей (миграции 0013, 0016): их
+    # строки удаляются в том же запросе, файлы фото остаются общими по sha256;
+    # users.ads_removed_at — Last-Modified для /ads/my
+    deleted = (
+        delete(Ad).where(owned(user_id, ids)).returning(*AFFECTED_COLUMNS).cte("deleted")
+    )
+    deleted_ids = select(deleted.c.id)
+    photos = delete(AdPhoto).where(AdPhoto.ad_id.in_(deleted_ids)).cte("photos")
+    matches = (
+        delete(AdMatch)
+        .where(or_(AdMatch.lost_ad_id.in_(deleted_ids), AdMatch.found_ad_id.in_(deleted_ids)))
+        .cte("matches")
+    )
+    removed = (
+        update(User)
+        .where(User.id == user_id, select(deleted.c.id).exists())
+        .values(ads_removed_at=func.now())
+        .cte("removed")
+    )
+    return (await session.execute(select(deleted).add_cte(photos, matches, removed))).all()
+
+
+@router.delete("/ads/{ad_id}")
+async def delete_ad(ad_id: int, session: sessionDep, principal: principalDep):
+    rows = await delete_ads(session, principal.id, [ad_id])
+    if not rows:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    await finish(session, rows)
+    return {"success": True}
+
+
+@router.post("/ads/delete")
+async def delete_many_ads(data: AdIds, session: sessionDep, principal: principalDep):
+    check_size(data.ids)
+    rows = await delete_ads(session, principal.id, data.ids)
+    await finish(session, rows)
+    return bulk_result(data.ids, rows, "deleted")
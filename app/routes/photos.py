@@ -0,0 +1,166 @@
+"""
+Фото объявлений.
+
+POST   /ads/{ad_id}/photos             — тело запроса — сам файл (JPEG, PNG, WebP),
+                                         без multipart; читается потоком
+GET    /ads/{ad_id}/photos             — фото объявления с URL копий
+DELETE /ads/{ad_id}/photos/{photo_id}
+GET    /photos/{kind}/{sha256}.jpg     — копии thumb и preview
+
+Копии не меняются (имя — хеш содержимого), поэтому отдаются с
+immutable-кэшем; в продакшене /photos/ лучше отдавать nginx или CDN
+(PHOTO_URL_PREFIX).
+"""
+import re
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+
+from cache import listing_cache
+from config import PHOTO_MAX_BYTES, PHOTO_MAX_PER_AD, PHOTO_POOL_SIZE
+from database import new_session
+from dependencies import principalDep
+from models import Ad, AdPhoto
+from photos import (
+    SIZES,
+    Thumbnailer,
+    copies_ready,
+    copy_key,
+    original_key,
+    photo_url,
+    receive,
+    touch_ads,
+)
+from ratelimit import rate_limit
+from routes.ad import ad_matches, etag_matches
+from storage import storage
+
+router = APIRouter(tags=["Photos"])
+
+NAME = re.compile(r"^([0-9a-f]{64})\.jpg$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+async def invalidate_ads(ads):
+    await listing_cache.invalidate(lambda params: any(ad_matches(params, ad) for ad in ads))
+
+
+thumbnailer = Thumbnailer(PHOTO_POOL_SIZE, invalidate_ads)
+
+
+def photo_out(photo: AdPhoto):
+    return {
+        "id": photo.id,
+        "position": photo.position,
+        "ready": photo.ready,
+        **{kind: photo_url(kind, photo.sha256) for kind in SIZES},
+    }
+
+
+async def own_ad(session, ad_id: int, user_id: int) -> Ad:
+    ad = await session.get(Ad, ad_id)
+    if ad is None or ad.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    return ad
+
+
+@router.post("/ads/{ad_id}/photos", dependencies=[rate_limit("photo")])
+async def upload_photo(ad_id: int, request: Request, principal: principalDep):
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > PHOTO_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Файл слишком большой")
+
+    # соединение с БД не держим, пока клиент передаёт файл
+    async with new_session() as session:
+        await own_ad(session, ad_id, principal.id)
+        count = await session.scalar(
+            select(func.count()).select_from(AdPhoto).where(AdPhoto.ad_id == ad_id)
+        )
+    if count >= PHOTO_MAX_PER_AD:
+        raise HTTPException(status_code=409, detail=f"Не больше {PHOTO_MAX_PER_AD} фото")
+
+    upload = storage.open_upload()
+    try:
+        sha256, content_type, size = await receive(request.stream(), upload)
+        await upload.commit(original_key(sha256))
+    finally:
+        await upload.discard()
+
+    # то же содержимое уже загружали: копии есть, обрабатывать нечего
+    ready = await copies_ready(sha256)
+    async with new_session() as session:
+        ad = await own_ad(session, ad_id, principal.id)
+        position = select(func.coalesce(func.max(AdPhoto.position) + 1, 0)).where(
+            AdPhoto.ad_id == ad_id
+        )
+        photo_id = await session.scalar(
+            insert(AdPhoto)
+            .values(
+                ad_id=ad_id,
+                sha256=sha256,
+                content_type=content_type,
+                size=size,
+                position=position.scalar_subquery(),
+                ready=ready,
+            )
+            .on_conflict_do_nothing(constraint="uq_ad_photos_ad_sha256")
+            .returning(AdPhoto.id)
+        )
+        if photo_id is not None and ready:
+            await touch_ads(session, [ad_id])
+        await session.commit()
+        if photo_id is None:
+            # повторная загрузка того же фото к тому же объявлению
+            photo = await session.scalar(
+                select(AdPhoto).where(AdPhoto.ad_id == ad_id, AdPhoto.sha256 == sha256)
+            )
+            return {"success": True, "photo": photo_out(photo)}
+        photo = await session.get(AdPhoto, photo_id)
+
+    if ready:
+        await invalidate_ads([ad])
+    else:
+        thumbnailer.enqueue([sha256])
+    return {"success": True, "photo": photo_out(photo)}
+
+
+@router.get("/ads/{ad_id}/photos")
+async def get_photos(ad_id: int):
+    async with new_session() as session:
+        photos = await session.scalars(
+            select(AdPhoto).where(AdPhoto.ad_id == ad_id).order_by(AdPhoto.position, AdPhoto.id)
+        )
+        return {"success": True, "photos": [photo_out(photo) for photo in photos]}
+
+
+@router.delete("/ads/{ad_id}/photos/{photo_id}")
+async def delete_photo(ad_id: int, photo_id: int, principal: principalDep):
+    async with new_session() as session:
+        ad = await own_ad(session, ad_id, principal.id)
+        deleted = await session.scalar(
+            delete(AdPhoto)
+            .where(AdPhoto.id == photo_id, AdPhoto.ad_id == ad_id)
+            .returning(AdPhoto.id)
+        )
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Фото не найдено")
+        await touch_ads(session, [ad_id])
+        await session.commit()
+    # файлы остаются: то же содержимое может быть у других объявлений
+    await invalidate_ads([ad])
+    return {"success": True}
+
+
+@router.get("/photos/{kind}/{name}")
+async def get_photo_copy(kind: str, name: str, request: Request):
+    match = NAME.match(name)
+    if kind not in SIZES or match is None:
+        raise HTTPException(status_code=404, detail="Фото не найдено")
+    sha256 = match.group(1)
+    etag = f'"{kind}-{sha256}"'
+    # путь исключён из сжатия (COMPRESSION_EXCLUDED_PATHS): Range-запросы по байтам файла
+    headers = {"Cache-Control": IMMUTABLE, "ETag": etag}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return await storage.response(copy_key(kind, sha256), "image/jpeg", headers)
@@ -1,30 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, Response, Request
-from sqlalchemy import select
+from fastapi import APIRouter, HTTPException, Response, Request
+from sqlalchemy import select, update, delete, or_
 from jose import JWTError, jwt
 from datetime import timedelta
-from typing import Annotated
-from dependencies import get_current_user, sessionDep, userDep
+from dependencies import (
+    sessionDep,
+    userDep,
+    principalDep,
+    user_claims,
+    get_user_profile,
+    forget_user,
+)
 import random
-from models import User
+from models import User, Ad, ArchivedAd, AdMatch, AdPhoto
 from schemas import UserRegister, UserLogin, UpdateEmail, UpdateName, UpdatePhone, UpdatePassword
-from database import get_session
 from auth import create_token, verify_password, hash_password, send_verification_email, send_verification_email_change
-from config import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, SECRET_KEY, ALGORITHM
+from config import JWT, PASSWORD_REHASH_ON_LOGIN
+from hashing import hasher
+from ratelimit import limiter, rate_limit, COSTS
+from revocation import revocations
 
 router = APIRouter(tags=["Users"])
 
 names = ["Альфа", "Барсик", "Крош", "Стрелка", "Мурзик"]
 
 
-@router.post("/register")
+@router.post("/register", dependencies=[rate_limit("register", sends_email=True)])
 async def register(user: UserRegister, session: sessionDep):
+    await limiter.check_account(user.email, COSTS["register"])
     existing = await session.scalar(select(User).where(User.email == user.email))
     if existing:
         raise HTTPException(status_code=400, detail="Email уже зарегистрирован")
 
     user_name = user.name or f"{random.choice(names)}{random.randint(1, 999)}"
 
-    password_hash = hash_password(user.password)
+    password_hash = await hash_password(user.password)
 
     verify_token = create_token(
         {
@@ -42,23 +51,26 @@ async def register(user: UserRegister, session: sessionDep):
     return {"success": True, "message": "Проверьте email для завершения регистрации"}
 
 
-@router.post("/login")
+@router.post("/login", dependencies=[rate_limit("login")])
 async def login(response: Response, data: UserLogin, session: sessionDep):
+    # по email, а не по id: подбор пароля к чужому аккаунту тоже ограничен
+    await limiter.check_account(data.email, COSTS["login"])
     user = await session.scalar(select(User).where(User.email == data.email))
-    if not user or not verify_password(data.password, user.password_hash):
+    if not user or not await verify_password(data.password, user.password_hash):
         raise HTTPException(status_code=400, detail="Неверный email или пароль")
 
-    access_token = create_token(
-        {"sub": str(user.id)}, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
-    refresh_token = create_token(
-        {"sub": str(user.id)}, timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    )
+    if PASSWORD_REHASH_ON_LOGIN and hasher.needs_rehash(user.password_hash):
+        user.password_hash = await hash_password(data.password)
+        await session.commit()
+
+    claims = user_claims(user)
+    access_token = create_token(claims, timedelta(minutes=JWT.access_token_expire_minutes))
+    refresh_token = create_token(claims, timedelta(days=JWT.refresh_token_expire_days))
 
     response.set_cookie(key="access_token", value=access_token, httponly=True)
     response.set_cookie(key="refresh_token", value=refresh_token, httponly=True)
 
-    return {"success": True, "message": "Вход выполнен"}  # ВОЗВРАЩАТЬ "role"
+    return {"success": True, "message": "Вход выполнен", "role": user.role}
 
 
 @router.get("/verify")
@@ -67,7 +79,7 @@ async def verify_email(token: str, session: sessionDep):
         raise HTTPException(status_code=400, detail="Токен не передан")
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, JWT.secret_key, algorithms=[JWT.algorithm])
         if payload.get("type") != "verify":
             raise HTTPException(status_code=400, detail="Неверный тип токена")
 
@@ -99,17 +111,8 @@ async def verify_email(token: str, session: sessionDep):
 
 
 @router.get("/me")
-async def get_me(request: Request):
-    access_token = request.cookies.get("access_token")
-    if not access_token:
-        raise HTTPException(status_code=401, detail="Нет access токена")
-
-    try:
-        jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
-
-        return {"success": True}  # ВОЗВРАЩАТЬ "role"
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Токен недействителен или истёк")
+async def get_me(principal: principalDep):
+    return {"success": True, "role": principal.role}
 
 
 @router.get("/refresh")
@@ -118,21 +121,41 @@ async def refresh_token(request: Request, response: Response):
     if not refresh_token:
         raise HTTPException(status_code=401, detail="Нет refresh токена")
     try:
-        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(refresh_token, JWT.secret_key, algorithms=[JWT.algorithm])
     except JWTError:
         raise HTTPException(status_code=401, detail="Недействительный refresh токен")
+    if await revocations.revoked(payload):
+        raise HTTPException(status_code=401, detail="Refresh токен отозван")
 
-    user_id = payload.get("sub")
-    new_access = create_token(
-        {"sub": user_id}, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
+    claims = {
+        "sub": payload.get("sub"),
+        "role": payload.get("role", "user"),
+        "ver": payload.get("ver", 0),
+    }
+    new_access = create_token(claims, timedelta(minutes=JWT.access_token_expire_minutes))
     response.set_cookie(key="access_token", value=new_access, httponly=True)
 
-    return {"success": True, "message": "Access токен обновлён"}  # ВОЗВРАЩАТЬ "role"
+    return {"success": True, "message": "Access токен обновлён", "role": claims["role"]}
 
 
 @router.get("/logout")
-async def logout(response: Response):
+async def logout(request: Request, response: Response, session: sessionDep):
+    # украденная копия cookie тоже перестаёт работать
+    rows = []
+    for name in ("access_token", "refresh_token"):
+        token = request.cookies.get(name)
+        if not token:
+            continue
+        try:
+            payload = jwt.decode(
+                token, JWT.secret_key, algorithms=[JWT.algorithm], options={"verify_exp": False}
+            )
+        except JWTError:
+            continue
+        rows.append(revocations.revoke_token(session, payload))
+    await session.commit()
+    revocations.remember(rows)
+
     response.delete_cookie("access_token")
     response.delete_cookie("refresh_token")
 
@@ -140,39 +163,32 @@ async def logout(response: Response):
 
 
 @router.get("/user")
-async def get_user(request: Request, session: sessionDep):
-    token = request.cookies.get("access_token")
-    if not token:
-        raise HTTPException(status_code=401, detail="Нет access токена")
-
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Токен недействителен или истёк")
-
-    user_id = payload.get("sub")
-    user = await session.get(User, int(user_id))
-    if not user:
+async def get_user(session: sessionDep, principal: principalDep):
+    profile = await get_user_profile(principal.id, session)
+    if not profile:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    return {
-        "user": {
-            "name": user.name,
-            "date": user.created_at.strftime("%d.%m.%Y"),
-            "email": user.email,
-            "phone": user.phone,
-        }
-    }
+    return {"user": profile}
 
 
 @router.delete("/user")
-async def delete_user(
-    response: Response,
-    session: sessionDep,
-    current_user: Annotated[User, Depends(get_current_user)],
-):
-    await session.delete(current_user)
+async def delete_user(response: Response, session: sessionDep, principal: principalDep):
+    # объявления удалятся каскадом, а у фото и совпадений внешних ключей нет
+    ad_ids = select(Ad.id).where(Ad.user_id == principal.id).union_all(
+        select(ArchivedAd.id).where(ArchivedAd.user_id == principal.id)
+    )
+    await session.execute(delete(AdPhoto).where(AdPhoto.ad_id.in_(ad_ids)))
+    await session.execute(
+        delete(AdMatch).where(
+            or_(AdMatch.lost_ad_id.in_(ad_ids), AdMatch.found_ad_id.in_(ad_ids))
+        )
+    )
+    result = await session.execute(delete(User).where(User.id == principal.id))
+    # без commit: удаление фото и совпадений откатится вместе с запросом
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
     await session.commit()
+    await forget_user(principal.id)
 
     response.delete_cookie("access_token")
     response.delete_cookie("refresh_token")
@@ -181,24 +197,30 @@ async def delete_user(
 
 
 @router.put("/user/name")
-async def update_name(data: UpdateName, session: sessionDep, current_user: userDep):
-    current_user.name = data.name
+async def update_name(data: UpdateName, session: sessionDep, principal: principalDep):
+    result = await session.execute(
+        update(User).where(User.id == principal.id).values(name=data.name)
+    )
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
     await session.commit()
+    await forget_user(principal.id)
     return {"success": True}
 
 
-@router.put("/user/email")
+@router.put("/user/email", dependencies=[rate_limit("email", sends_email=True)])
 async def update_email(
     data: UpdateEmail,
     session: sessionDep,
-    current_user: userDep,
+    principal: principalDep,
 ):
-    existing = await session.scalar(select(User).where(User.email == data.email))
-    if existing and existing.id != current_user.id:
+    await limiter.check_account(principal.id, COSTS["email"])
+    existing = await session.scalar(select(User.id).where(User.email == data.email))
+    if existing and existing != principal.id:
         return {"success": False, "message": "Email уже занят"}
 
     change_token = create_token(
-        {"sub": str(current_user.id), "new_email": data.email, "type": "email_change"},
+        {"sub": str(principal.id), "new_email": data.email, "type": "email_change"},
         timedelta(minutes=30)
     )
 
@@ -208,21 +230,43 @@ async def update_email(
 
 
 @router.put("/user/phone")
-async def update_phone(data: UpdatePhone, session: sessionDep, current_user: userDep):
-    current_user.phone = data.phone
+async def update_phone(data: UpdatePhone, session: sessionDep, principal: principalDep):
+    result = await session.execute(
+        update(User).where(User.id == principal.id).values(phone=data.phone)
+    )
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
     await session.commit()
+    await forget_user(principal.id)
     return {"success": True}
 
 
-@router.put("/user/password")
+@router.put("/user/password", dependencies=[rate_limit("password")])
 async def update_password(
-    data: UpdatePassword, session: sessionDep, current_user: userDep
+    data: UpdatePassword, response: Response, session: sessionDep, current_user: userDep
 ):
-    if not verify_password(data.curPassword, current_user.password_hash):
+    await limiter.check_account(current_user.id, COSTS["password"])
+    if not await verify_password(data.curPassword, current_user.password_hash):
         return {"success": False, "message": "Неверный текущий пароль"}
 
-    current_user.password_hash = hash_password(data.newPassword)
+    password_hash = await hash_password(data.newPassword)
+    # остальные сессии завершаются, текущая получает новые токены; версия
+    # повышается в БД, чтобы параллельные смены не выдали одну и ту же
+    version = await session.scalar(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(password_hash=password_hash, token_version=User.token_version + 1)
+        .returning(User.token_version)
+    )
+    row = revocations.revoke_user(session, current_user.id, version)
     await session.commit()
+    revocations.remember([row])
+
+    claims = {**user_claims(current_user), "ver": version}
+    access_token = create_token(claims, timedelta(minutes=JWT.access_token_expire_minutes))
+    refresh_token = create_token(claims, timedelta(days=JWT.refresh_token_expire_days))
+    response.set_cookie(key="access_token", value=access_token, httponly=True)
+    response.set_cookie(key="refresh_token", value=refresh_token, httponly=True)
     return {"success": True}
 
 @router.get("/user/verify-email-change")
@@ -231,7 +275,9 @@ async def verify_email_change(token: str, session: sessionDep, response: Respons
         raise HTTPException(status_code=400, detail="Токен не передан")
 
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, JWT.secret_key, algorithms=[JWT.algorithm])
+        if await revocations.revoked({"jti": payload.get("jti")}):
+            raise HTTPException(status_code=400, detail="Ссылка уже использована")
         if payload.get("type") != "email_change":
             raise HTTPException(status_code=400, detail="Неверный тип токена")
         user_id = int(payload["sub"])
@@ -250,8 +296,20 @@ async def verify_email_change(token: str, session: sessionDep, response: Respons
     if existing and existing.id != user.id:
         raise HTTPException(status_code=400, detail="Email уже занят")
 
-    user.email = new_email
+    version = await session.scalar(
+        update(User)
+        .where(User.id == user.id)
+        .values(email=new_email, token_version=User.token_version + 1)
+        .returning(User.token_version)
+    )
+    rows = [
+        revocations.revoke_user(session, user.id, version),
+        # ссылка из письма одноразовая
+        revocations.revoke_token(session, payload),
+    ]
     await session.commit()
+    revocations.remember(rows)
+    await forget_user(user.id)
 
     response.delete_cookie("access_token")
     response.delete_cookie("refresh_token")
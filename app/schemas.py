@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, model_validator
 from typing import Optional, Literal, List
 from datetime import datetime
 
@@ -25,24 +25,52 @@ class UserOut(BaseModel):
         from_attributes = True
 
 
+# длины как у колонок ads: слишком длинное значение — ошибка валидации, а не БД
 class AdCreate(BaseModel):
     status: Literal["lost", "found"]
     type: Literal["dog", "cat"]
     breed: Literal["labrador", "german_shepherd", "poodle", "metis"]
-    color: str
+    color: str = Field(max_length=20)
     size: Literal["little", "medium", "big"]
     distincts: str = ""
-    nickname: str = ""
+    nickname: str = Field("", max_length=50)
     danger: Literal["danger", "safe", "unknown"]
-    location: str = ""
+    location: str = Field("", max_length=100)
     geoLocation: List[float] = []
     time: str
-    contactName: str
-    contactPhone: str
-    contactEmail: EmailStr
+    contactName: str = Field(max_length=50)
+    contactPhone: str = Field(max_length=20)
+    contactEmail: EmailStr = Field(max_length=100)
     extras: str = ""
 
 
+class AdUpdate(BaseModel):
+    """PATCH /ads/{id}: меняются только переданные поля."""
+
+    status: Optional[Literal["lost", "found"]] = None
+    type: Optional[Literal["dog", "cat"]] = None
+    breed: Optional[Literal["labrador", "german_shepherd", "poodle", "metis"]] = None
+    color: Optional[str] = Field(None, max_length=20)
+    size: Optional[Literal["little", "medium", "big"]] = None
+    distincts: Optional[str] = None
+    nickname: Optional[str] = Field(None, max_length=50)
+    danger: Optional[Literal["danger", "safe", "unknown"]] = None
+    location: Optional[str] = Field(None, max_length=100)
+    geoLocation: Optional[List[float]] = None
+    time: Optional[str] = None
+    contactName: Optional[str] = Field(None, max_length=50)
+    contactPhone: Optional[str] = Field(None, max_length=20)
+    contactEmail: Optional[EmailStr] = Field(None, max_length=100)
+    extras: Optional[str] = None
+
+    @model_validator(mode="after")
+    def place_together(self):
+        # регион вычисляется из обоих полей (regions.derive_region)
+        if ("location" in self.model_fields_set) != ("geoLocation" in self.model_fields_set):
+            raise ValueError("location и geoLocation меняются вместе")
+        return self
+
+
 class AdOut(BaseModel):
     id: int
     status: str
@@ -60,11 +88,95 @@ class AdOut(BaseModel):
     contactPhone: str
     contactEmail: str
     extras: str = ""
+    state: str = "active"
+    # URL превью готовых фото; полноразмерные — GET /ads/{id}/photos
+    photos: List[str] = []
+
+    class Config:
+        from_attributes = True
+
+
+class AdCard(BaseModel):
+    """Карточка в ленте (fields=card): без описания и контактов."""
+
+    id: int
+    status: str
+    type: str
+    breed: str
+    color: str
+    size: str
+    nickname: str = ""
+    danger: str
+    location: str = ""
+    geoLocation: List[float] = []
+    time: datetime
+    photos: List[str] = []
+
+    class Config:
+        from_attributes = True
+
+
+class AdExport(BaseModel):
+    """Выгрузка /ads/stream (fields=full): всё, кроме контактов."""
+
+    id: int
+    status: str
+    type: str
+    breed: str
+    color: str
+    size: str
+    distincts: str = ""
+    nickname: str = ""
+    danger: str
+    location: str = ""
+    geoLocation: List[float] = []
+    time: datetime
+    extras: str = ""
+    state: str = "active"
+    photos: List[str] = []
 
     class Config:
         from_attributes = True
 
 
+class ArchivedAdOut(AdOut):
+    archived_at: datetime
+
+
+class ArchivedAdCard(AdCard):
+    """Объявление из архива для всех: без описания и контактов."""
+
+    state: str
+    archived_at: datetime
+
+
+# пакетная валидация и сериализация списков объявлений за один проход
+ad_list_adapter = TypeAdapter(List[AdOut])
+ad_card_list_adapter = TypeAdapter(List[AdCard])
+ad_export_list_adapter = TypeAdapter(List[AdExport])
+archived_ad_list_adapter = TypeAdapter(List[ArchivedAdOut])
+
+
+class AdStateUpdate(BaseModel):
+    # expired ставит только архиватор
+    state: Literal["active", "resolved", "closed"]
+
+
+class AdIds(BaseModel):
+    ids: List[int] = Field(min_length=1)
+
+
+class AdStateBulkUpdate(AdIds, AdStateUpdate):
+    pass
+
+
+class AdMatchOut(BaseModel):
+    ad_id: int  # объявление владельца
+    score: float
+    distance_km: Optional[float] = None
+    match: AdOut
+
+
 class AdFilters(BaseModel):
     status: Optional[str] = None
     type: Optional[str] = None
@@ -73,7 +185,11 @@ class AdFilters(BaseModel):
     danger: Optional[str] = None
     region: Optional[str] = None
     geoloc: Optional[List[str]] = None
-    radius: Optional[int] = None
+    radius: Optional[int] = Field(None, gt=0, le=500)  # км
+    query: Optional[str] = Field(None, max_length=200)
+    cursor: Optional[str] = None
+    limit: int = Field(50, ge=1, le=100)
+    fields: Literal["full", "card"] = "full"
 
 
 class UpdateName(BaseModel):
@@ -0,0 +1,22 @@
+from sqlalchemy import func, or_
+from models import Ad
+
+SEARCH_CONFIG = "russian"
+
+
+def text_search(query: str):
+    """
+    Условие поиска и выражение релевантности. Полнотекстовый поиск идёт по
+    search_vector (GIN), кличка и окрас дополнительно сравниваются по
+    триграммам, чтобы находить опечатки.
+    """
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    condition = or_(
+        Ad.search_vector.op("@@")(tsquery),
+        Ad.nickname.op("%")(query),
+        Ad.color.op("%")(query),
+    )
+    rank = func.ts_rank_cd(Ad.search_vector, tsquery) + func.greatest(
+        func.similarity(Ad.nickname, query), func.similarity(Ad.color, query)
+    )
+    return condition, rank
@@ -0,0 +1,99 @@
+"""
+Хранилище файлов фото.
+
+Ключи — пути вида "original/ab/<sha256>": одинаковое содержимое лежит в
+одном месте. Загрузка пишется потоком во временный файл и получает ключ,
+когда известен хеш; если такой файл уже есть, временный просто удаляется.
+
+Другое хранилище (S3 и т.п.) реализует те же методы и выбирается
+PHOTO_STORAGE в make_storage().
+"""
+import asyncio
+import os
+import tempfile
+
+from fastapi import HTTPException
+from fastapi.responses import FileResponse
+
+from config import STORAGE
+
+
+class LocalUpload:
+    def __init__(self, root: str):
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+        self.root = root
+        self.file = tempfile.NamedTemporaryFile(dir=os.path.join(root, "tmp"), delete=False)
+
+    async def write(self, chunk: bytes):
+        await asyncio.to_thread(self.file.write, chunk)
+
+    async def commit(self, key: str) -> bool:
+        """Кладёт файл под key; False, если такой файл уже был."""
+        path = os.path.join(self.root, key)
+
+        def move():
+            self.file.close()
+            if os.path.exists(path):
+                os.unlink(self.file.name)
+                return False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self.file.name, path)
+            return True
+
+        return await asyncio.to_thread(move)
+
+    async def discard(self):
+        def remove():
+            self.file.close()
+            if os.path.exists(self.file.name):
+                os.unlink(self.file.name)
+
+        await asyncio.to_thread(remove)
+
+
+class LocalStorage:
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def open_upload(self) -> LocalUpload:
+        return LocalUpload(self.root)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.path(key))
+
+    async def read(self, key: str) -> bytes:
+        def read():
+            with open(self.path(key), "rb") as f:
+                return f.read()
+
+        return await asyncio.to_thread(read)
+
+    async def write(self, key: str, data: bytes):
+        path = self.path(key)
+
+        def write():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # сначала во временный файл: читатель не увидит недописанный
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+                f.write(data)
+            os.replace(f.name, path)
+
+        await asyncio.to_thread(write)
+
+    async def response(self, key: str, media_type: str, headers: dict):
+        """Ответ с файлом; Range и If-Range обрабатывает FileResponse."""
+        if not await self.exists(key):
+            raise HTTPException(status_code=404, detail="Фото не найдено")
+        return FileResponse(self.path(key), media_type=media_type, headers=headers)
+
+
+def make_storage():
+    if STORAGE.backend == "local":
+        return LocalStorage(STORAGE.dir)
+    raise ValueError(f"Неизвестный STORAGE.backend: {STORAGE.backend}")
+
+
+storage = make_storage()
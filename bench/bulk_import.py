@@ -0,0 +1,116 @@
+"""
+Бенчмарк массовой загрузки: строк в секунду через /ads/create по одной,
+/ads/bulk (JSON-массив) и /ads/import (NDJSON и CSV), в процессе через ASGI.
+
+    cd app && python ../bench/bulk_import.py --rows 5000
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import time
+from datetime import timedelta
+
+import httpx
+
+from seed import ensure_user, drop_user
+
+from auth import create_token
+from database import engine, new_session
+from main import app
+from migrations import migrate
+from schemas import AdCreate
+
+BENCH_EMAIL = "bench-bulk@findyourpet.local"
+
+
+def make_item(i):
+    return {
+        "status": "found" if i % 2 else "lost",
+        "type": "cat" if i % 3 == 0 else "dog",
+        "breed": "metis",
+        "color": "рыжий",
+        "size": "medium",
+        "distincts": f"белое пятно на груди, №{i}",
+        "nickname": "Барсик",
+        "danger": "unknown",
+        "location": "Москва, ул. Пушкина, 10",
+        "geoLocation": [55.75 + i % 100 * 0.001, 37.61],
+        "time": "01.01.2026 12:00",
+        "contactName": "Приют",
+        "contactPhone": "+70000000000",
+        "contactEmail": "shelter@example.com",
+        "extras": "",
+    }
+
+
+def as_csv(items):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(AdCreate.model_fields)
+    for item in items:
+        item = {**item, "geoLocation": ";".join(map(str, item["geoLocation"]))}
+        writer.writerow(item.values())
+    return buffer.getvalue().encode()
+
+
+async def timed(name, rows, request):
+    started = time.perf_counter()
+    inserted = await request()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<16} {rows:>7} строк  {elapsed:7.2f} с  {rows / elapsed:9.0f} строк/с")
+    assert inserted == rows, f"{name}: вставлено {inserted} из {rows}"
+
+
+async def main(args):
+    await migrate(engine)
+    async with new_session() as session:
+        user_id = await ensure_user(session, BENCH_EMAIL)
+
+    token = create_token({"sub": str(user_id), "role": "user", "ver": 0}, timedelta(hours=1))
+    items = [make_item(i) for i in range(args.rows)]
+    single = items[: args.single]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", cookies={"access_token": token}, timeout=600
+    ) as client:
+
+        async def one_by_one():
+            for item in single:
+                response = await client.post("/ads/create", json=item)
+                response.raise_for_status()
+            return len(single)
+
+        async def bulk():
+            inserted = 0
+            for start in range(0, len(items), args.chunk):
+                response = await client.post("/ads/bulk", json=items[start : start + args.chunk])
+                inserted += response.json()["inserted"]
+            return inserted
+
+        async def import_body(body, content_type):
+            response = await client.post(
+                "/ads/import", content=body, headers={"content-type": content_type}
+            )
+            return response.json()["inserted"]
+
+        ndjson = "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items).encode()
+
+        await timed("/ads/create", len(single), one_by_one)
+        await timed("/ads/bulk", len(items), bulk)
+        await timed("/ads/import ndjson", len(items), lambda: import_body(ndjson, "application/x-ndjson"))
+        await timed("/ads/import csv", len(items), lambda: import_body(as_csv(items), "text/csv"))
+
+    async with new_session() as session:
+        await drop_user(session, user_id)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--single", type=int, default=500, help="строк через /ads/create")
+    parser.add_argument("--chunk", type=int, default=1000, help="объявлений в одном /ads/bulk")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,159 @@
+"""
+Проверка планов запросов: каждый типовой запрос списка объявлений должен
+идти по одному из ожидаемых индексов из migrations.py, а не последовательным
+сканированием. Возвращает код 1, если план не совпал. Нужен Postgres;
+tests/test_plans.py запускает ту же проверку под pytest.
+
+    cd app && python ../bench/check_plans.py --rows 200000
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+
+from seed import ensure_user, ensure_users, seed_ads, drop_user
+
+from sqlalchemy import select, text
+
+from archive import archive_query
+from database import engine, new_session
+from matching import candidates_query
+from migrations import migrate
+from models import Ad, User
+from routes.ad import ads_query, page_query
+from schemas import AdFilters
+
+BENCH_EMAIL = "bench-plans@findyourpet.local"
+OWNER_EMAIL = "bench-plans-owner@findyourpet.local"
+ROWS = 200_000
+# на паре десятков пользователей seq scan по users дешевле индекса
+USERS = 10_000
+USERS_PREFIX = "bench-plans-user"
+
+
+def cases(owner_id):
+    my_ads = select(Ad).where(Ad.user_id == owner_id)
+    lost_dog = Ad(
+        user_id=owner_id,
+        status="lost",
+        type="dog",
+        breed="labrador",
+        size="big",
+        color="рыжий",
+        lat=55.75,
+        lon=37.62,
+        time=datetime.now(timezone.utc),
+    )
+    return [
+        ("без фильтров", ads_query(AdFilters()), {"ix_ads_created_at_id"}),
+        # фильтр оставляет ~20% строк: обратный проход по (created_at, id) до
+        # LIMIT не хуже составного индекса (см. комментарий в миграции 0003)
+        (
+            "status + type",
+            ads_query(AdFilters(status="lost", type="cat")),
+            {"ix_ads_status_type_created_at", "ix_ads_created_at_id"},
+        ),
+        (
+            "breed",
+            ads_query(AdFilters(breed="poodle")),
+            {"ix_ads_breed_created_at", "ix_ads_created_at_id"},
+        ),
+        ("danger", ads_query(AdFilters(danger="danger")), {"ix_ads_danger_created_at"}),
+        ("регион", ads_query(AdFilters(region="RU-MOW")), {"ix_ads_region_created_at"}),
+        # Postgres 18 проходит (type, status, lat, lon) с пропуском первых колонок
+        (
+            "радиус",
+            ads_query(AdFilters(geoloc=["55.75", "37.62"], radius=5)),
+            {"ix_ads_lat_lon", "ix_ads_type_status_lat_lon"},
+        ),
+        (
+            "поиск по тексту",
+            ads_query(AdFilters(query="рыжие уши")),
+            {"ix_ads_search_vector"},
+        ),
+        # как и для радиуса, годится любой из двух индексов по координатам
+        (
+            "кандидаты в пару",
+            candidates_query(lost_dog),
+            {"ix_ads_type_status_lat_lon", "ix_ads_lat_lon"},
+        ),
+        (
+            "перенос в архив",
+            archive_query(datetime.now(timezone.utc), 1000),
+            {"ix_ads_closed_at"},
+        ),
+        (
+            "мои объявления",
+            page_query(my_ads, Ad.created_at, True, None, 50),
+            {"ix_ads_user_id_created_at"},
+        ),
+        (
+            "пользователь по email",
+            select(User).where(User.email == OWNER_EMAIL),
+            {"users_email_key"},
+        ),
+    ]
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from walk(child)
+
+
+async def explain(session, query):
+    # параметры передаются как в приложении: не у всех типов есть литералы
+    compiled = query.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    connection = await session.connection()
+    result = await connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), params)
+    raw = result.scalar()
+    plan = json.loads(raw) if isinstance(raw, str) else raw
+    return list(walk(plan[0]["Plan"]))
+
+
+async def check_plans(rows: int = ROWS, keep: bool = False):
+    """[(название, ok, использованные индексы, таблицы с seq scan)] по каждому запросу."""
+    await migrate(engine)
+
+    results = []
+    async with new_session() as session:
+        user_id = await ensure_user(session, BENCH_EMAIL)
+        owner_id = await ensure_user(session, OWNER_EMAIL)
+        await seed_ads(session, user_id, rows)
+        await seed_ads(session, owner_id, 30)
+        await ensure_users(session, USERS_PREFIX, USERS, "-")
+        await session.execute(text("ANALYZE users"))
+
+        for name, query, indexes in cases(owner_id):
+            nodes = await explain(session, query)
+            used = {node["Index Name"] for node in nodes if "Index Name" in node}
+            seq = [node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"]
+            results.append((name, bool(indexes & used) and not seq, sorted(used), seq))
+
+        if not keep:
+            await drop_user(session, user_id)
+            await drop_user(session, owner_id)
+            await session.execute(
+                text("DELETE FROM users WHERE email LIKE :pattern"),
+                {"pattern": f"{USERS_PREFIX}-%"},
+            )
+            await session.commit()
+
+    await engine.dispose()
+    return results
+
+
+async def main(args):
+    results = await check_plans(args.rows, args.keep)
+    for name, ok, used, seq in results:
+        print(f"[{'ok' if ok else 'FAIL'}] {name}: индексы {used}, seq scan {seq}")
+    sys.exit(0 if all(ok for _, ok, _, _ in results) else 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=ROWS)
+    parser.add_argument("--keep", action="store_true", help="не удалять данные после прогона")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,70 @@
+"""
+Бенчмарк поиска по тексту (POST /ads с query) на синтетическом корпусе.
+
+    cd app && python ../bench/fulltext_search.py --rows 300000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from seed import ensure_user, seed_ads, drop_user
+
+from database import engine, new_session
+from migrations import migrate
+from routes.ad import ads_query
+from schemas import AdFilters
+
+BENCH_EMAIL = "bench-search@findyourpet.local"
+
+QUERIES = [
+    "белое пятно на груди",
+    "рыжие уши",
+    "хромает",
+    "ошейник -синий",
+    "Барсек",  # опечатка
+    "Мурзик",
+    "пятнистый",
+    "найден у метро",
+]
+
+
+async def measure(session, filters, repeat):
+    timings = []
+    found = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await session.execute(ads_query(filters))
+        found = len(result.all())
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[-1], found
+
+
+async def main(args):
+    await migrate(engine)
+
+    async with new_session() as session:
+        user_id = await ensure_user(session, BENCH_EMAIL)
+        await seed_ads(session, user_id, args.rows)
+
+        print(f"{'query':<24} {'filters':<10} {'p50, ms':>9} {'max, ms':>9} {'rows':>5}")
+        for text in QUERIES:
+            for label, extra in (("-", {}), ("dog,lost", {"type": "dog", "status": "lost"})):
+                filters = AdFilters(query=text, **extra)
+                await measure(session, filters, 2)  # прогрев
+                p50, worst, found = await measure(session, filters, args.repeat)
+                print(f"{text:<24} {label:<10} {p50:>9.2f} {worst:>9.2f} {found:>5}")
+
+        if not args.keep:
+            await drop_user(session, user_id)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="не удалять данные после прогона")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,73 @@
+"""
+Бенчмарк поиска по радиусу (POST /ads с geoloc/radius).
+
+Заполняет таблицу ads синтетическими объявлениями (10k -> 100k -> 1M) и
+замеряет задержку запроса, который строит routes.ad.ads_query. Нужна
+отдельная тестовая БД: переменные окружения те же, что у приложения.
+
+    cd app && python ../bench/geo_radius.py --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from seed import LAT_RANGE, LON_RANGE, ensure_user, seed_ads, drop_user
+
+from database import engine, new_session
+from migrations import migrate
+from routes.ad import ads_query
+from schemas import AdFilters
+
+BENCH_EMAIL = "bench-geo@findyourpet.local"
+
+
+async def measure(session, radius, queries):
+    timings = []
+    for _ in range(queries):
+        filters = AdFilters(
+            geoloc=[str(random.uniform(*LAT_RANGE)), str(random.uniform(*LON_RANGE))],
+            radius=radius,
+        )
+        started = time.perf_counter()
+        result = await session.scalars(ads_query(filters))
+        result.all()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50": statistics.median(timings),
+        "p95": timings[int(len(timings) * 0.95) - 1],
+        "max": timings[-1],
+    }
+
+
+async def main(args):
+    await migrate(engine)
+
+    async with new_session() as session:
+        user_id = await ensure_user(session, BENCH_EMAIL)
+        print(f"{'rows':>10} {'radius':>7} {'p50, ms':>9} {'p95, ms':>9} {'max, ms':>9}")
+        for size in args.sizes:
+            await seed_ads(session, user_id, size)
+            for radius in args.radius:
+                await measure(session, radius, 5)  # прогрев
+                stats = await measure(session, radius, args.queries)
+                print(
+                    f"{size:>10} {radius:>7} {stats['p50']:>9.2f} "
+                    f"{stats['p95']:>9.2f} {stats['max']:>9.2f}"
+                )
+
+        if not args.keep:
+            await drop_user(session, user_id)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--radius", type=int, nargs="+", default=[1, 5, 25])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="не удалять данные после прогона")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,274 @@
+"""
+Нагрузочный прогон API смесью типичных запросов.
+
+Приложение запускается в процессе (httpx через ASGI, без сети) или берётся
+уже запущенное uvicorn по --url; база — локальный Postgres из .env
+(SQLite не подходит: схема использует массивы, tsvector и pg_trgm).
+Перед прогоном создаются --users пользователей с паролем PASSWORD и
+--ads объявлений; каждый виртуальный пользователь логинится и выполняет
+сценарии по весам MIX.
+
+Отчёт — p50/p95/p99 и RPS по каждому сценарию; в задержки попадают только
+ответы 2xx. Любой другой ответ или сетевая ошибка — прогон не засчитывается:
+код 1, базовая линия не сохраняется. --save сохраняет отчёт как базовую
+линию, --compare сравнивает с ней и завершается с кодом 1, если p95 или RPS
+какого-то сценария хуже более чем на --tolerance процентов.
+
+Все виртуальные пользователи приходят с одного IP, поэтому в процессе
+ограничения частоты выключены; сервер для --url запускается с
+RATE_LIMIT_ENABLED=0.
+
+    cd app && python ../bench/load.py --duration 30 --save ../bench/baselines/main.json
+    cd app && python ../bench/load.py --duration 30 --compare ../bench/baselines/main.json
+    cd app && python ../bench/load.py --url http://127.0.0.1:8000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+import httpx
+from sqlalchemy import text
+
+from seed import ensure_users, seed_ads
+
+from database import engine, new_session
+from hashing import hasher
+from migrations import migrate
+
+PASSWORD = "bench-password"
+USER_PREFIX = "bench-load"
+
+# сценарий -> вес в смеси
+MIX = {
+    "list": 60,
+    "list_filtered": 15,
+    "my": 10,
+    "create": 5,
+    "refresh": 7,
+    "login": 3,
+}
+
+STATUSES = ("lost", "found")
+TYPES = ("dog", "cat")
+BREEDS = ("labrador", "german_shepherd", "poodle", "metis")
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def new_ad(i):
+    return {
+        "status": random.choice(STATUSES),
+        "type": random.choice(TYPES),
+        "breed": random.choice(BREEDS),
+        "color": "рыжий",
+        "size": "medium",
+        "distincts": f"нагрузочный тест {i}",
+        "nickname": "Барсик",
+        "danger": "unknown",
+        "location": "Москва",
+        "geoLocation": [55.75, 37.61],
+        "time": "01.01.2026 12:00",
+        "contactName": "bench",
+        "contactPhone": "+70000000000",
+        "contactEmail": "bench@example.com",
+        "extras": "",
+    }
+
+
+async def scenario(name, client, email):
+    if name == "list":
+        return await client.post("/ads", json={})
+    if name == "list_filtered":
+        filters = {"status": random.choice(STATUSES), "type": random.choice(TYPES)}
+        if random.random() < 0.5:
+            filters["breed"] = random.choice(BREEDS)
+        return await client.post("/ads", json=filters)
+    if name == "my":
+        return await client.get("/ads/my")
+    if name == "create":
+        return await client.post("/ads/create", json=new_ad(random.randrange(10**6)))
+    if name == "refresh":
+        return await client.get("/refresh")
+    if name == "login":
+        return await client.post("/login", json={"email": email, "password": PASSWORD})
+    raise ValueError(name)
+
+
+async def virtual_user(make_client, email, deadline, samples, errors):
+    names, weights = list(MIX), list(MIX.values())
+    async with make_client() as client:
+        response = await client.post("/login", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        while time.perf_counter() < deadline:
+            name = random.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                response = await scenario(name, client, email)
+                error = None if response.is_success else f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            if error:
+                errors[name][error] += 1
+            else:
+                samples[name].append(time.perf_counter() - started)
+
+
+def report(samples, errors, elapsed):
+    result = {}
+    for name in MIX:
+        timings = samples[name]
+        result[name] = {
+            "requests": len(timings),
+            "errors": sum(errors[name].values()),
+            "rps": len(timings) / elapsed,
+            "p50_ms": percentile(timings, 50) * 1000,
+            "p95_ms": percentile(timings, 95) * 1000,
+            "p99_ms": percentile(timings, 99) * 1000,
+        }
+    timings = [t for name in MIX for t in samples[name]]
+    result["total"] = {
+        "requests": len(timings),
+        "errors": sum(sum(counts.values()) for counts in errors.values()),
+        "rps": len(timings) / elapsed,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+    }
+    return result
+
+
+def print_report(result, baseline=None):
+    print(f"{'сценарий':<14} {'запросов':>8} {'ошибок':>7} {'RPS':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for name, row in result.items():
+        line = (
+            f"{name:<14} {row['requests']:>8} {row['errors']:>7} {row['rps']:>8.1f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+        )
+        if baseline and name in baseline:
+            base = baseline[name]
+            line += f"   RPS {change(row['rps'], base['rps']):+.0f}%"
+            line += f"  p95 {change(row['p95_ms'], base['p95_ms']):+.0f}%"
+        print(line)
+
+
+def change(value, base):
+    return (value - base) / base * 100 if base else 0.0
+
+
+def regressions(result, baseline, tolerance):
+    found = []
+    for name, row in result.items():
+        base = baseline.get(name)
+        if not base or not row["requests"]:
+            continue
+        if change(row["p95_ms"], base["p95_ms"]) > tolerance:
+            found.append(f"{name}: p95 {base['p95_ms']:.1f} -> {row['p95_ms']:.1f} мс")
+        if -change(row["rps"], base["rps"]) > tolerance:
+            found.append(f"{name}: RPS {base['rps']:.1f} -> {row['rps']:.1f}")
+    return found
+
+
+async def main(args):
+    random.seed(args.seed)
+    await migrate(engine)
+    async with new_session() as session:
+        users = await ensure_users(session, USER_PREFIX, args.users, await hasher.hash(PASSWORD))
+        await seed_ads(session, users[0][0], args.ads)
+
+    if args.url:
+        def make_client():
+            return httpx.AsyncClient(base_url=args.url, timeout=30)
+    else:
+        from main import app
+
+        transport = httpx.ASGITransport(app=app)
+
+        def make_client():
+            return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=30)
+
+    samples = {name: [] for name in MIX}
+    errors = {name: Counter() for name in MIX}
+
+    # прогрев: соединения пула, кэш списков, потоки bcrypt
+    warm_deadline = time.perf_counter() + args.warmup
+    await asyncio.gather(
+        *(
+            virtual_user(make_client, users[i % len(users)][1], warm_deadline, samples, errors)
+            for i in range(min(args.concurrency, len(users)))
+        )
+    )
+    samples = {name: [] for name in MIX}
+    errors = {name: Counter() for name in MIX}
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(
+        *(
+            virtual_user(make_client, users[i % len(users)][1], deadline, samples, errors)
+            for i in range(args.concurrency)
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    # объявления, созданные сценарием create, не копятся между прогонами
+    async with new_session() as session:
+        await session.execute(
+            text("DELETE FROM ads WHERE \"contactName\" = 'bench' AND distincts LIKE 'нагрузочный тест %'")
+        )
+        await session.commit()
+    hasher.shutdown()
+    await engine.dispose()
+
+    result = report(samples, errors, elapsed)
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print(f"{args.concurrency} клиентов, {elapsed:.0f} с")
+    print_report(result, baseline and baseline["results"])
+
+    failed = {name: counts for name, counts in errors.items() if counts}
+    if failed:
+        for name, counts in failed.items():
+            print("ОШИБКИ", name, ", ".join(f"{error}: {n}" for error, n in counts.items()))
+        sys.exit(1)
+
+    if args.save:
+        path = Path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {k: v for k, v in vars(args).items() if k not in ("save", "compare")}
+        path.write_text(json.dumps({"args": meta, "results": result}, indent=2))
+        print(f"Базовая линия сохранена в {path}")
+
+    if baseline:
+        found = regressions(result, baseline["results"], args.tolerance)
+        for line in found:
+            print("РЕГРЕССИЯ", line)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="адрес запущенного сервера; по умолчанию в процессе")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--ads", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="сохранить результат как базовую линию (JSON)")
+    parser.add_argument("--compare", help="сравнить с базовой линией (JSON)")
+    parser.add_argument("--tolerance", type=float, default=15, help="допустимое ухудшение, %%")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,97 @@
+"""
+Размер ответа и CPU сервера на одну страницу списка: fields=full и card,
+без сжатия, gzip и brotli (если установлен brotli-asgi). Страница
+рендерится тем же render_page, сжимает тот же middleware, что в main.py;
+запросы идут через httpx в процессе, без БД и сети.
+
+Синтетические тексты повторяются, поэтому сжимаются лучше живых данных:
+смотреть стоит на соотношения, а не на абсолютные байты.
+
+    cd app && python ../bench/payload.py --rows 50 --requests 500
+"""
+import argparse
+import asyncio
+import time
+from collections import namedtuple
+
+import httpx
+from fastapi import FastAPI, Response
+from fastapi.middleware.gzip import GZipMiddleware
+
+from serialize_ads import make_values
+
+from config import COMPRESSION_MIN_SIZE, GZIP_LEVEL, BROTLI_QUALITY
+from routes.ad import FIELDSETS, render_page
+
+
+def make_rows(fields, count):
+    columns = FIELDSETS[fields][0]
+    Row = namedtuple("Row", [column.key for column in columns] + ["sort_key"])
+    rows = []
+    for i in range(count):
+        values = make_values(i)
+        row = {k: values[k] for k in Row._fields if k != "sort_key"}
+        rows.append(Row(**row, sort_key=values["created_at"]))
+    return rows
+
+
+def make_app(fields, rows, compression):
+    app = FastAPI()
+
+    @app.get("/ads")
+    async def ads():
+        return Response(render_page(rows, len(rows), fields), media_type="application/json")
+
+    if compression == "gzip":
+        app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE, compresslevel=GZIP_LEVEL)
+    elif compression == "brotli":
+        from brotli_asgi import BrotliMiddleware
+
+        app.add_middleware(BrotliMiddleware, quality=BROTLI_QUALITY, minimum_size=COMPRESSION_MIN_SIZE)
+    return app
+
+
+async def measure(app, encoding, requests):
+    # CPU считается только внутри приложения: httpx и распаковка не в счёт
+    spent = [0.0]
+
+    async def timed_app(scope, receive, send):
+        started = time.process_time()
+        await app(scope, receive, send)
+        spent[0] += time.process_time() - started
+
+    transport = httpx.ASGITransport(app=timed_app)
+    headers = {"Accept-Encoding": encoding}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.get("/ads", headers=headers)
+        wire = response.num_bytes_downloaded
+        spent[0] = 0.0
+        for _ in range(requests):
+            await client.get("/ads", headers=headers)
+    return wire, spent[0] / requests
+
+
+async def main(args):
+    variants = [("off", "identity"), ("gzip", "gzip")]
+    try:
+        import brotli_asgi  # noqa: F401
+
+        variants.append(("brotli", "br"))
+    except ImportError:
+        print("brotli-asgi не установлен, brotli пропущен")
+
+    print(f"{'fields':<6} {'сжатие':<7} {'байт':>9} {'CPU, мс':>9}")
+    baseline = None
+    for fields in ("full", "card"):
+        rows = make_rows(fields, args.rows)
+        for compression, encoding in variants:
+            wire, cpu = await measure(make_app(fields, rows, compression), encoding, args.requests)
+            baseline = baseline or wire
+            print(f"{fields:<6} {compression:<7} {wire:>9} {cpu * 1000:>9.3f}   {wire / baseline:>5.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
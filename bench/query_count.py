@@ -0,0 +1,102 @@
+"""
+Число запросов к БД на операцию владельца: создание, правка, закрытие,
+удаление — каждая по одному и списком. Каждая должна укладываться в один
+запрос (INSERT/UPDATE/DELETE ... RETURNING); BEGIN и COMMIT asyncpg шлёт
+не через курсор и не считаются. Возвращает код 1, если где-то запросов
+больше. Нужен Postgres; tests/test_query_count.py запускает ту же проверку
+под pytest.
+
+    cd app && python ../bench/query_count.py
+"""
+import asyncio
+import os
+import sys
+from datetime import timedelta
+
+# фоновый поиск пар и NOTIFY между воркерами — отдельные запросы, не часть операции
+os.environ["MATCH_ENABLED"] = "0"
+os.environ["FEED_NOTIFY"] = "0"
+
+import httpx
+from sqlalchemy import event
+
+from bulk_import import make_item
+from seed import ensure_user, drop_user
+
+from auth import create_token
+from database import engine, new_session
+from main import app
+from migrations import migrate
+
+BENCH_EMAIL = "bench-query-count@findyourpet.local"
+EXPECTED = 1
+
+
+async def count_statements():
+    """[(операция, выполненные запросы)] по каждой операции владельца."""
+    await migrate(engine)
+    async with new_session() as session:
+        user_id = await ensure_user(session, BENCH_EMAIL)
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    token = create_token({"sub": str(user_id), "role": "user", "ver": 0}, timedelta(hours=1))
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", cookies={"access_token": token}
+        ) as client:
+
+            async def measure(name, method, url, body=None):
+                statements.clear()
+                response = await client.request(method, url, json=body)
+                response.raise_for_status()
+                results.append((name, list(statements)))
+                return response.json()
+
+            ids = []
+            for i in range(4):
+                created = await measure("создание", "POST", "/ads/create", make_item(i))
+                ids.append(created["ad_id"])
+            first, *rest = ids
+
+            await measure("правка", "PATCH", f"/ads/{first}", {"nickname": "Рыжик", "color": "рыжий"})
+            await measure(
+                "правка места",
+                "PATCH",
+                f"/ads/{first}",
+                {"location": "Москва, Тверская, 1", "geoLocation": [55.76, 37.61]},
+            )
+            await measure("закрытие", "PUT", f"/ads/{first}/state", {"state": "resolved"})
+            await measure("закрытие списком", "POST", "/ads/state", {"ids": rest, "state": "closed"})
+            await measure("открытие списком", "POST", "/ads/state", {"ids": ids, "state": "active"})
+            await measure("удаление", "DELETE", f"/ads/{first}")
+            result = await measure("удаление списком", "POST", "/ads/delete", {"ids": ids})
+            assert result["deleted"] == sorted(rest) and result["missing"] == [first], result
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+        async with new_session() as session:
+            await drop_user(session, user_id)
+        await engine.dispose()
+    return results
+
+
+async def main():
+    failed = 0
+    for name, statements in await count_statements():
+        ok = len(statements) == EXPECTED
+        failed += not ok
+        print(f"[{'ok' if ok else 'FAIL'}] {name}: {len(statements)} запрос(ов)")
+        if not ok:
+            for statement in statements:
+                print("    ", " ".join(statement.split())[:200])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+"""
+Стоимость проверки отзыва токена в get_principal, без БД: разбор JWT
+без проверки и с проверкой по спискам из REVOCATION_MAX_ENTRIES записей.
+
+    cd app && python ../bench/revocation_check.py
+"""
+import argparse
+import time
+import timeit
+from datetime import timedelta
+from uuid import uuid4
+
+import seed  # noqa: F401  (добавляет app в sys.path)
+
+from jose import jwt
+
+from auth import create_token
+from config import JWT
+from revocation import RevocationList
+
+
+def main(args):
+    revocations = RevocationList(args.entries)
+    expires = time.time() + 3600
+    for i in range(args.entries):
+        revocations.jtis[uuid4().hex] = expires
+        revocations.versions[i] = (2, expires)
+
+    token = create_token({"sub": "42", "role": "user", "ver": 3}, timedelta(minutes=5))
+    revoked = create_token({"sub": "7", "role": "user", "ver": 1}, timedelta(minutes=5))
+    payload = jwt.decode(token, JWT.secret_key, algorithms=[JWT.algorithm])
+    assert not revocations.is_revoked(payload)
+    assert revocations.is_revoked(jwt.decode(revoked, JWT.secret_key, algorithms=[JWT.algorithm]))
+
+    def decode():
+        return jwt.decode(token, JWT.secret_key, algorithms=[JWT.algorithm])
+
+    def decode_and_check():
+        return revocations.is_revoked(jwt.decode(token, JWT.secret_key, algorithms=[JWT.algorithm]))
+
+    def check():
+        return revocations.is_revoked(payload)
+
+    for name, fn in (("jwt.decode", decode), ("decode + отзыв", decode_and_check), ("только отзыв", check)):
+        per_call = min(timeit.repeat(fn, number=args.number, repeat=5)) / args.number
+        print(f"{name:<16} {per_call * 1e6:8.2f} мкс")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--number", type=int, default=20_000)
+    main(parser.parse_args())
@@ -0,0 +1,104 @@
+"""Общие функции бенчмарков: путь к app и синтетические объявления."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from sqlalchemy import text  # noqa: E402
+
+from models import User  # noqa: E402
+
+# примерно европейская часть России
+LAT_RANGE = (43.0, 61.0)
+LON_RANGE = (28.0, 56.0)
+
+SEED_SQL = text(
+    """
+    INSERT INTO ads (user_id, status, type, breed, color, size, distincts, nickname,
+                     danger, location, "geoLocation", lat, lon, time, "contactName",
+                     "contactPhone", "contactEmail", extras, created_at)
+    SELECT :user_id,
+           (ARRAY['lost','found'])[1 + (random() < 0.5)::int],
+           (ARRAY['dog','cat'])[1 + (random() < 0.4)::int],
+           (ARRAY['metis','metis','labrador','german_shepherd','poodle'])[1 + floor(random() * 5)::int],
+           (ARRAY['белый','чёрный','рыжий','серый','пятнистый'])[1 + floor(random() * 5)::int],
+           (ARRAY['little','medium','big'])[1 + floor(random() * 3)::int],
+           (ARRAY['белое пятно на груди','рыжие уши','хромает на заднюю лапу',
+                  'синий ошейник','купированный хвост','очень пугливый',
+                  'чёрная полоса на спине','разные глаза'])[1 + floor(random() * 8)::int]
+           || ', ' ||
+           (ARRAY['найден у метро','бегал во дворе','без ошейника','с адресником',
+                  'подобран на трассе','жмётся к людям'])[1 + floor(random() * 6)::int],
+           (ARRAY['Барсик','Мурзик','Шарик','Рекс','Альфа','Стрелка','Найда','Тузик',
+                  'Бублик','Снежок','Граф','Лаки',''])[1 + floor(random() * 13)::int],
+           (ARRAY['safe','unknown','unknown','unknown','unknown','unknown','unknown',
+                  'unknown','unknown','danger'])[1 + floor(random() * 10)::int],
+           '', ARRAY[p.lat, p.lon], p.lat, p.lon, now(), 'bench', '+70000000000',
+           'bench@findyourpet.local', '', now() - (g || ' seconds')::interval
+    FROM generate_series(1, :count) AS g,
+         LATERAL (SELECT CAST(:min_lat AS float8)
+                             + random() * (CAST(:max_lat AS float8) - CAST(:min_lat AS float8))
+                             + g * 0 AS lat,
+                         CAST(:min_lon AS float8)
+                             + random() * (CAST(:max_lon AS float8) - CAST(:min_lon AS float8))
+                             + g * 0 AS lon) AS p
+    """
+)
+
+
+async def ensure_user(session, email: str):
+    query = text("SELECT id FROM users WHERE email = :email").bindparams(email=email)
+    user_id = await session.scalar(query)
+    if user_id:
+        return user_id
+    session.add(User(email=email, password_hash="-", name="bench"))
+    await session.commit()
+    return await session.scalar(query)
+
+
+async def ensure_users(session, prefix: str, count: int, password_hash: str):
+    """count пользователей prefix-N@example.com с общим хэшем пароля -> [(id, email)]."""
+    emails = [f"{prefix}-{i}@example.com" for i in range(count)]
+    await session.execute(
+        text(
+            """
+            INSERT INTO users (email, password_hash, name, role, created_at, token_version)
+            SELECT email, :hash, 'bench', 'user', now(), 0 FROM unnest(CAST(:emails AS varchar[])) AS email
+            ON CONFLICT (email) DO UPDATE SET password_hash = EXCLUDED.password_hash
+            """
+        ),
+        {"hash": password_hash, "emails": emails},
+    )
+    await session.commit()
+    result = await session.execute(
+        text("SELECT id, email FROM users WHERE email = ANY(:emails) ORDER BY id"),
+        {"emails": emails},
+    )
+    return [tuple(row) for row in result]
+
+
+async def seed_ads(session, user_id: int, target: int):
+    """Догоняет число объявлений пользователя до target и обновляет статистику."""
+    current = await session.scalar(
+        text("SELECT count(*) FROM ads WHERE user_id = :uid").bindparams(uid=user_id)
+    )
+    if current < target:
+        await session.execute(
+            SEED_SQL,
+            {
+                "user_id": user_id,
+                "count": target - current,
+                "min_lat": LAT_RANGE[0],
+                "max_lat": LAT_RANGE[1],
+                "min_lon": LON_RANGE[0],
+                "max_lon": LON_RANGE[1],
+            },
+        )
+        await session.commit()
+    await session.execute(text("ANALYZE ads"))
+    await session.commit()
+
+
+async def drop_user(session, user_id: int):
+    await session.execute(text("DELETE FROM users WHERE id = :uid").bindparams(uid=user_id))
+    await session.commit()
@@ -0,0 +1,89 @@
+"""
+Микробенчмарк сериализации списка объявлений, без БД.
+
+old — как было: ORM-объекты Ad -> [AdOut.model_validate] -> jsonable_encoder
+      -> JSONResponse;
+new — routes.ad.render_page: строки с нужными колонками -> TypeAdapter
+      (validate + dump_json) -> готовые байты.
+
+    cd app && python ../bench/serialize_ads.py --sizes 50 500 5000
+"""
+import argparse
+import timeit
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import seed  # noqa: F401  (добавляет app в sys.path)
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models import Ad
+from photos import photo_url
+from routes.ad import AD_OUT_COLUMNS, render_page
+from schemas import AdOut
+
+Row = namedtuple("Row", [column.key for column in AD_OUT_COLUMNS] + ["sort_key"])
+
+
+def make_values(i):
+    created = datetime(2026, 1, 1, tzinfo=timezone.utc) - timedelta(minutes=i)
+    return {
+        "id": i,
+        "status": "lost",
+        "type": "dog",
+        "breed": "metis",
+        "color": "рыжий",
+        "size": "medium",
+        "distincts": "белое пятно на груди, ошейник " * 4,
+        "nickname": "Барсик",
+        "danger": "safe",
+        "location": "Москва, ул. Пушкина, 10",
+        "geoLocation": (55.75 + i * 1e-5, 37.62),
+        "time": created,
+        "contactName": "Иван",
+        "contactPhone": "+79990000000",
+        "contactEmail": "ivan@example.com",
+        "extras": "отзывается на кличку " * 6,
+        "state": "active",
+        "photos": [photo_url("thumb", f"{i:064x}"), photo_url("thumb", f"{i + 1:064x}")],
+        "created_at": created,
+    }
+
+
+def old_path(ads):
+    ads_out = [AdOut.model_validate(ad) for ad in ads]
+    return JSONResponse(jsonable_encoder({"success": True, "ads": ads_out})).body
+
+
+def new_path(rows):
+    return render_page(rows, len(rows))
+
+
+def main(args):
+    print(f"{'rows':>6} {'old, ms':>9} {'new, ms':>9} {'speedup':>8} {'bytes':>9}")
+    for size in args.sizes:
+        values = [make_values(i) for i in range(size)]
+        ads = []
+        for value in values:
+            ad = Ad(**{k: v for k, v in value.items() if k != "photos"})
+            ad.photos = value["photos"]  # не колонка: подзапрос к ad_photos
+            ads.append(ad)
+        rows = [
+            Row(**{k: v[k] for k in Row._fields if k != "sort_key"}, sort_key=v["created_at"])
+            for v in values
+        ]
+        number = max(1, args.budget // size)
+        old = min(timeit.repeat(lambda: old_path(ads), number=number, repeat=5)) / number
+        new = min(timeit.repeat(lambda: new_path(rows), number=number, repeat=5)) / number
+        print(
+            f"{size:>6} {old * 1000:>9.3f} {new * 1000:>9.3f} "
+            f"{old / new:>7.1f}x {len(new_path(rows)):>9}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--budget", type=int, default=20000, help="строк на замер")
+    main(parser.parse_args())
@@ -0,0 +1,78 @@
+"""
+Время запуска воркеров uvicorn от команды до готовности.
+
+Запускает uvicorn main:app --workers N, ждёт от каждого воркера строку
+«Воркер … готов» (startup.ready) и печатает его импорт и запуск, а также
+время от запуска команды до готовности последнего воркера. Нужна база из
+.env; для production-режима миграции должны быть уже применены:
+
+    cd app && python migrations.py
+    cd app && python ../bench/startup.py --workers 4 --mode dev
+    cd app && python ../bench/startup.py --workers 4 --mode production
+"""
+import argparse
+import os
+import queue
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+READY = re.compile(r"Воркер (\d+) готов за ([\d.]+) с \(импорт ([\d.]+) с, запуск ([\d.]+) с\)")
+
+
+def run(args):
+    env = {**os.environ, "STARTUP_MODE": args.mode, "PYTHONUNBUFFERED": "1"}
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--workers", str(args.workers), "--port", str(args.port), "--log-level", "warning",
+    ]
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    lines = queue.Queue()
+    threading.Thread(target=lambda: [lines.put(line) for line in process.stdout], daemon=True).start()
+
+    workers = []
+    deadline = started + args.timeout
+    try:
+        while len(workers) < args.workers:
+            try:
+                line = lines.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                raise SystemExit(f"за {args.timeout} с готовы {len(workers)} из {args.workers}")
+            match = READY.search(line)
+            if match:
+                pid, total, imported, startup = match.groups()
+                workers.append((pid, float(imported), float(startup), time.perf_counter() - started))
+            elif args.verbose:
+                print(line, end="")
+    finally:
+        process.terminate()
+        process.wait()
+    return workers
+
+
+def main(args):
+    last = []
+    for attempt in range(args.runs):
+        workers = run(args)
+        print(f"прогон {attempt + 1}: {'pid':>8} {'импорт, с':>10} {'запуск, с':>10} {'от команды, с':>14}")
+        for pid, imported, startup, wall in workers:
+            print(f"{'':>10} {pid:>8} {imported:>10.2f} {startup:>10.2f} {wall:>14.2f}")
+        last.append(max(wall for *_, wall in workers))
+    print(f"все {args.workers} готовы (медиана по прогонам): {statistics.median(last):.2f} с")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=["dev", "production"], default="production")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--verbose", action="store_true", help="печатать остальной вывод uvicorn")
+    main(parser.parse_args())
@@ -0,0 +1,50 @@
+"""
+Тесты против настоящего Postgres: подключение берётся из тех же DB_*, что у
+приложения (лучше отдельная база — тесты создают и удаляют свои данные).
+Без DB_NAME или без доступного сервера тесты с фикстурой postgres пропускаются.
+
+    DB_USER=... DB_PASSWORD=... DB_NAME=findyourpet_test python -m pytest -q
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "app"), str(ROOT / "bench")]
+
+# config.py требует SMTP и ключ; письма в тестах не отправляются
+for name, value in {
+    "SECRET_KEY": "test",
+    "SMTP_HOST": "localhost",
+    "APP_URL": "http://localhost",
+    "EMAIL_FROM": "test@example.com",
+}.items():
+    os.environ.setdefault(name, value)
+# фоновый поиск пар и NOTIFY между воркерами — лишние запросы в подсчётах
+os.environ["MATCH_ENABLED"] = "0"
+os.environ["FEED_NOTIFY"] = "0"
+
+
+async def ping():
+    from sqlalchemy import text
+
+    from database import engine
+
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def postgres():
+    if not os.environ.get("DB_NAME"):
+        pytest.skip("DB_NAME не задан: нужен Postgres")
+    try:
+        asyncio.run(ping())
+    except OSError as e:
+        pytest.skip(f"Postgres недоступен: {e}")
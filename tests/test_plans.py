@@ -0,0 +1,9 @@
+import asyncio
+
+
+def test_listing_queries_use_indexes(postgres):
+    from check_plans import check_plans
+
+    results = asyncio.run(check_plans())
+    failed = [(name, used, seq) for name, ok, used, seq in results if not ok]
+    assert not failed, failed
@@ -0,0 +1,10 @@
+import asyncio
+
+
+def test_owner_operations_take_one_statement(postgres):
+    from query_count import EXPECTED, count_statements
+
+    results = asyncio.run(count_statements())
+    assert len(results) == 11
+    failed = [(name, statements) for name, statements in results if len(statements) != EXPECTED]
+    assert not failed, failed